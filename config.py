@@ -1,5 +1,16 @@
+import os
 from pydantic_settings import BaseSettings
 
+
+def _default_pool_workers() -> int:
+    # cpu_count() reports the host's cores inside a container; honour the CPU affinity and keep the pool small
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 2
+    return max(1, min(4, cpus))
+
+
 class Settings(BaseSettings):
     # OPENAI_API_KEY: str
     REDIS_HOST: str
@@ -10,8 +21,121 @@ class Settings(BaseSettings):
     JWT_SECRET_KEY: str
     MAILERSEND_API_KEY:str
     XAI_API_KEY: str
+
+    # Shared HTTP connection pool for all xAI clients
+    XAI_HTTP_MAX_CONNECTIONS: int = 20
+    XAI_HTTP_MAX_KEEPALIVE: int = 10
+    XAI_HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    XAI_HTTP2: bool = True
     PINECONE_API_KEY: str
     PINECONE_INDEX_NAME: str
+
+    # Process pool for CPU-bound document work; workers are recycled every PROCESS_POOL_MAX_TASKS tasks
+    PROCESS_POOL_ENABLED: bool = True
+    PROCESS_POOL_WORKERS: int = _default_pool_workers()
+    PROCESS_POOL_MAX_TASKS: int = 500
+
+    # Classify relevance and extract in one LLM call instead of two
+    UPLOAD_COMBINED_LLM_CALL: bool = True
+
+    # Relevance check on a token-bounded sample; 0 sends the full text
+    RELEVANCE_SAMPLE_TOKENS: int = 3000
+    RELEVANCE_HEAD_RATIO: float = 0.6
+    RELEVANCE_CHUNK_TOKENS: int = 300
+    # Start the relevance check once this many pages have text, cancelling OCR on a High confidence rejection (0 disables)
+    RELEVANCE_SPECULATION_PAGES: int = 2
+
+    # Map-reduce extraction: documents longer than this are extracted per chunk (0 disables)
+    EXTRACTION_CHUNK_TOKENS: int = 12000
+    EXTRACTION_CHUNK_OVERLAP: int = 200
+    EXTRACTION_MAX_WORKERS: int = 4
+
+    # Incremental extraction: extract every N pages as they are OCR'd and stop OCR once
+    # the required fields are filled or the filled fraction reaches the coverage threshold (0 disables).
+    # Each attempt re-sends every page so far; a document that never reaches the threshold costs
+    # up to MAX_ATTEMPTS extra extraction calls on top of the final full-text one.
+    EXTRACTION_INCREMENTAL_PAGES: int = 3
+    EXTRACTION_INCREMENTAL_MAX_ATTEMPTS: int = 3
+    EXTRACTION_EARLY_STOP_COVERAGE: float = 0.9
+
+    # Upload streaming
+    UPLOAD_MAX_BYTES: int = 25 * 1024 * 1024
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    UPLOAD_SPOOL_MAX_MEMORY: int = 2 * 1024 * 1024
+
+    # Background upload jobs
+    UPLOAD_JOB_WORKERS: int = 4
+    UPLOAD_JOB_TTL: int = 24 * 3600
+    # /upload/stream sends an SSE comment after this many idle seconds and gives up after the timeout
+    UPLOAD_STREAM_KEEPALIVE: int = 15
+    UPLOAD_STREAM_TIMEOUT: int = 900
+
+    # OCR
+    OCR_MAX_WORKERS: int = 4
+    OCR_MAX_RETRIES: int = 2
+    OCR_RETRY_BACKOFF: float = 1.0
+
+    # OCR backend: "vision", "tesseract" or "auto" (Tesseract, escalating low-confidence pages to vision)
+    OCR_BACKEND: str = "auto"
+    OCR_TESSERACT_LANG: str = "eng"
+    OCR_TESSERACT_TIMEOUT: int = 60
+    OCR_TESSERACT_MIN_CONFIDENCE: float = 80.0
+    OCR_TESSERACT_MIN_CHARS: int = 20
+
+    # Pre-OCR page classification
+    OCR_SKIP_BLANK_PAGES: bool = True
+    OCR_BLANK_MAX_STDDEV: float = 3.0
+    OCR_DEDUPE_PAGES: bool = True
+    OCR_DUPLICATE_MAX_DISTANCE: int = 8
+    OCR_DUPLICATE_MAX_DIFFERENCE: float = 2.0
+
+    # PDF rasterization
+    PDF_DPI: int = 200
+    PDF_THREAD_COUNT: int = 1
+    PDF_PAGE_WINDOW: int = 2
+    PDF_MIN_DPI: int = 100
+
+    # PDF text layer; pages below these thresholds are sent to OCR
+    PDF_TEXT_LAYER: bool = True
+    PDF_TEXT_TIMEOUT: int = 30
+    PDF_TEXT_MIN_CHARS: int = 50
+    PDF_TEXT_MIN_READABLE_RATIO: float = 0.85
+
+    DOC_TEXT_TIMEOUT: int = 30
+
+    # CSV ingestion
+    CSV_CHUNK_ROWS: int = 1000
+    CSV_MAX_TOKENS: int = 20000
+    CSV_PRUNE_EMPTY_COLUMNS: bool = True
+
+    # OCR result cache: "local", "redis" or "none"
+    OCR_CACHE_BACKEND: str = "local"
+    OCR_CACHE_DIR: str = "/tmp/ocr_cache"
+    OCR_CACHE_MAX_ENTRIES: int = 10000
+    OCR_CACHE_TTL: int = 30 * 24 * 3600
+
+    # Exact-match Redis cache for analyze_intent and query_from_chat
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_ENTRIES: int = 50000
+    LLM_CACHE_TTL: int = 24 * 3600
+
+    # Semantic /kv-chat answer cache; first-turn questions only by default since answers depend on the conversation
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_THRESHOLD: float = 0.95
+    ANSWER_CACHE_MAX_PER_BUCKET: int = 100
+    ANSWER_CACHE_TTL: int = 6 * 3600
+    ANSWER_CACHE_FIRST_TURN_ONLY: bool = True
+
+    # Image preparation before vision OCR upload
+    OCR_IMAGE_PREPARE: bool = True
+    OCR_IMAGE_MAX_EDGE: int = 2048
+    OCR_IMAGE_GRAYSCALE: bool = True
+    OCR_IMAGE_FORMAT: str = "JPEG"
+    OCR_IMAGE_QUALITY: int = 85
+    OCR_IMAGE_MIN_QUALITY: int = 60
+    OCR_IMAGE_MAX_BYTES: int = 1_000_000
+    OCR_IMAGE_DETAIL: str = "high"
+
     class Config:
         env_file = ".env"
 
@@ -1,10 +1,15 @@
-from fastapi import FastAPI, UploadFile, File, Header, HTTPException, Form
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from routes.auth import auth_router
 from routes.upload import upload_router
 from routes.session import session_router
 from routes.chat import chat_router
+from config import settings
+from services.http import XAIHttpPool
+from services.pool import ProcessPool
+from services.processor import ocr_backend
 from utils.logger import setup_logger
 
 logger = setup_logger('main')
@@ -31,6 +36,22 @@ logger = setup_logger('main')
 
 app = FastAPI()
 
+# Slack for the multipart envelope around the file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Reject oversized uploads from Content-Length before the body is received.
+# Registered before CORSMiddleware so the 413 still carries CORS headers.
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    if request.method == "POST" and request.url.path in ("/upload", "/upload/stream"):
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > settings.UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD_BYTES:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"File too large. Maximum size is {settings.UPLOAD_MAX_BYTES} bytes"}
+            )
+    return await call_next(request)
+
 # CORS configuration
 origins = ["*"]
 
@@ -47,6 +68,21 @@ app.add_middleware(
 async def health():
     return {"status": "ok"}
 
+@app.on_event("shutdown")
+async def close_pools():
+    await XAIHttpPool().aclose()
+    ProcessPool().shutdown()
+
+# xAI connection pool utilization
+@app.get("/health/http")
+async def http_pool_stats():
+    return XAIHttpPool().stats()
+
+# Vision OCR bytes saved and latency per image preparation setting
+@app.get("/health/ocr")
+async def ocr_image_stats():
+    return ocr_backend.image_stats()
+
 app.include_router(auth_router, prefix="", tags=["auth"])
 app.include_router(session_router, prefix="", tags=["session"])
 app.include_router(upload_router, prefix="", tags=["upload"])
@@ -56,6 +56,13 @@ class CheckRelevance(BaseModel):
     document_type: str = Field(description="Identified type of the document based on the content.")
     confidence: str = Field(description="Confidence of the indentified type based on the content (High/Medium/Low)")
 
+class CheckAndIngestDocument(BaseModel):
+    document_type: str = Field(description="Identified type of the document based on the content (relevant_document/irrelevant_document).")
+    confidence: str = Field(description="Confidence of the indentified type based on the content (High/Medium/Low)")
+    extracted_info: Optional[LoanDocument] = Field(default=None, description="Data extracted from Loan document, only for relevant documents")
+    message: str = Field(default="", description="Generated User message")
+    chat_title: str = Field(default="", description="A short title less than 4 words for the document")
+
 class Filters(BaseModel):
     field: str = Field(description="Field to filter (e.g., name, service_area) mentioned in user message")
     operator: str = Field(description="Operator (e.g., '=', 'contains', 'startswith', 'textsearch').")
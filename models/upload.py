@@ -0,0 +1,33 @@
+from datetime import datetime
+from typing import Optional
+
+
+class UploadRecord:
+    def __init__(self, content_hash: str, user_id: str, session_id: str, document_id: str, document_info: dict, created_at: Optional[datetime] = None):
+        self.content_hash = content_hash
+        self.user_id = user_id
+        self.session_id = session_id
+        self.document_id = document_id
+        self.document_info = document_info
+        self.created_at = created_at or datetime.utcnow()
+
+    def to_dict(self):
+        return {
+            "content_hash": self.content_hash,
+            "user_id": self.user_id,
+            "session_id": self.session_id,
+            "document_id": self.document_id,
+            "document_info": self.document_info,
+            "created_at": self.created_at.timestamp(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "UploadRecord":
+        return cls(
+            content_hash=data["content_hash"],
+            user_id=data["user_id"],
+            session_id=data["session_id"],
+            document_id=data["document_id"],
+            document_info=data.get("document_info", {}),
+            created_at=datetime.fromtimestamp(data["created_at"]) if data.get("created_at") else None,
+        )
@@ -1,8 +1,9 @@
 from utils.jwt import JWT
 from fastapi import APIRouter, Header
+from fastapi.concurrency import run_in_threadpool
 from config import settings
 from utils.logger import setup_logger
-from utils.helper import document_to_promptable
+from utils.helper import document_to_promptable, retrieved_document_ids
 from pydantic import BaseModel
 from typing import Optional
 import uuid
@@ -13,6 +14,7 @@ from services.redis import RedisService
 from services.xai import XAICompletion
 from services.xai import XAIEmbedding
 from services.pinecone import PineconeService
+from services.cache import get_answer_cache
 
 jwt = JWT(settings.JWT_SECRET_KEY, "HS256")
 session_service = SessionService()
@@ -21,6 +23,7 @@ document_service = DocumentService()
 xai_service = XAICompletion()
 embed = XAIEmbedding()
 pinecone_service = PineconeService()
+answer_cache = get_answer_cache()
 
 chat_router = APIRouter()
 logger = setup_logger('chat')
@@ -30,14 +33,24 @@ class ChatRequest(BaseModel):
     document_id: Optional[str] = None
     context_type: str = "both"
 
+@chat_router.get("/kv-chat/cache")
+async def chat_cache_stats():
+    stats = xai_service.cache_stats()
+    if answer_cache:
+        stats["generate_response"] = answer_cache.stats()
+    return stats
+
 @chat_router.post("/kv-chat")
 async def chat(
     request: ChatRequest,
     authorization: str = Header(...),
     session_id: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None),
 ):  
     try:
         user_id = jwt.decode_token(authorization)["sub"]
+        # "Cache-Control: no-cache" bypasses the intent and filter response cache
+        use_cache = "no-cache" not in (cache_control or "").lower()
         is_new_session = False
         if not session_id:
             session_id = str(uuid.uuid4())
@@ -47,7 +60,9 @@ async def chat(
         conversation = redis_service.get_conversation(session_id)
         kb_mongo_result = ""
         kb_pinecone_result = ""
-        intent_response = xai_service.analyze_intent(conversation, request.message)
+        vector = None
+        document_ids = []
+        intent_response = await xai_service.aanalyze_intent(conversation, request.message, use_cache=use_cache)
         intent = intent_response.get('intent')
 
         if intent == 'out_of_scope':
@@ -60,14 +75,16 @@ async def chat(
             }
 
         if intent in ["follow_up_lender", "filtered_lender"]:
-            query = xai_service.query_from_chat(request.message, conversation)
-            kb_mongo_result = document_service.search_documents(query)
-            kb_mongo_result = document_to_promptable(kb_mongo_result)
+            query = await xai_service.aquery_from_chat(request.message, conversation, use_cache=use_cache)
+            kb_mongo_documents = document_service.search_documents(query)
+            kb_mongo_result = document_to_promptable(kb_mongo_documents)
 
-            vector = embed.create_embedding(request.message)
-            kb_pinecone_result = pinecone_service.query_vectors(vector)
+            # Embedding and vector search use blocking clients, keep them off the event loop
+            vector = await run_in_threadpool(embed.create_embedding, request.message)
+            kb_pinecone_result = await run_in_threadpool(pinecone_service.query_vectors, vector)
             
             print(f"Pinecone result: {kb_pinecone_result}") 
+            document_ids = retrieved_document_ids(kb_mongo_documents, kb_pinecone_result)
 
         if kb_mongo_result == "" and kb_pinecone_result == "":
             return {
@@ -78,7 +95,23 @@ async def chat(
                 "intent_reason": intent_response.get('reason')
             }
         
-        response = xai_service.generate_response(intent, request.message, conversation, kb_mongo_result, kb_pinecone_result)
+        # Semantic answer cache: paraphrases of an earlier question over the same, unchanged documents
+        cacheable = (
+            answer_cache is not None
+            and vector is not None
+            and document_ids
+            and not (settings.ANSWER_CACHE_FIRST_TURN_ONLY and conversation)
+        )
+        response = None
+        if cacheable:
+            versions = answer_cache.document_versions(document_ids)
+            if use_cache:
+                response = answer_cache.get(vector, intent, document_ids, versions)
+
+        if response is None:
+            response = await xai_service.agenerate_response(intent, request.message, conversation, kb_mongo_result, kb_pinecone_result)
+            if cacheable and response:
+                answer_cache.set(vector, intent, document_ids, versions, response)
 
         if response is None:
             return {
@@ -1,15 +1,21 @@
 from utils.jwt import JWT
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from pydantic import BaseModel
+import asyncio
+import hashlib
+import json
 import mimetypes
 import os
+import tempfile
 import uuid 
 from fastapi import APIRouter, UploadFile, File, Header, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from config import settings
 from utils.logger import setup_logger
 
 from services.document import DocumentService
-from services.processor import DocumentProcessor
+from services.jobs import JobService
 from services.session import SessionService
 from services.redis import RedisService
 from services.xai import XAICompletion
@@ -23,11 +29,12 @@ ALLOWED_MIMETYPES = {
     'image/png': '.png',
     'application/msword': '.doc',
     'application/vnd.openxmlformats-officedocument.wordprocessingml.document': '.docx',
-    'text/plain': '.txt'
+    'text/plain': '.txt',
+    'text/csv': '.csv'
 }
 
 jwt = JWT(settings.JWT_SECRET_KEY, "HS256")
-processor = DocumentProcessor()
+job_service = JobService()
 document_service = DocumentService()
 session_service = SessionService()
 redis_service = RedisService()
@@ -46,6 +53,32 @@ async def get_user_id(authorization):
     user_id = jwt.decode_token(authorization)["sub"]
     return user_id
 
+async def spool_upload(file: UploadFile) -> Tuple[tempfile.SpooledTemporaryFile, str, int]:
+    """
+    Copy the upload in chunks into a spooled buffer, hashing it on the way and
+    rejecting it as soon as it passes UPLOAD_MAX_BYTES
+    Returns:
+        Tuple[SpooledTemporaryFile, str, int]: (buffer positioned at 0, sha256 hex digest, size in bytes)
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.UPLOAD_SPOOL_MAX_MEMORY)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while True:
+            chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > settings.UPLOAD_MAX_BYTES:
+                raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {settings.UPLOAD_MAX_BYTES} bytes")
+            digest.update(chunk)
+            spool.write(chunk)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, digest.hexdigest(), size
+
 @upload_router.post("/upload")
 async def upload_file(
     file: UploadFile = File(...),
@@ -62,102 +95,103 @@ async def upload_file(
     if content_type not in ALLOWED_MIMETYPES:
         raise HTTPException(status_code=400, detail=f"File type not allowed. Allowed types: {', '.join(ALLOWED_MIMETYPES.values())}")
 
-    try:
-        # Processing document
-        content = await file.read()
-        text = processor.process_document(content, file.filename)
-        if not text:
-            logger.info(f"Failed to extract text from document - User: {user_id}, "f"File: {file.filename}")
-            return {
-                "session_id": session_id,
-                "message": "Failed to extract text from document"
-            }
-
-        document_id = str(uuid.uuid4())
-
-        # Check document relevance
-        relevancy = xai_service.check_relevance(text)
-        if relevancy.get('document_type') == 'irrelevant_document':
-            return {
-                "session_id": session_id,
-                "message": "The document is not relevant",
-                "confidence": relevancy.confidence
-            }
-
-        # Extract document information
-        document_info = xai_service.ingest_document(text)
-        print(document_info)
-        extracted_info = document_info.get('extracted_info')
-
-        # Check if document already exists based on company name
-        similar_documents = document_service.find_similar_documents(LoanDocument(**extracted_info))
-        
-        print(similar_documents)
-
-        # Check if the user has an existing session with all similar documents
-        existing_session = None
-        for document_data in similar_documents:
-            document = LoanDocument.from_dict(document_data)
-            existing_session = session_service.get_session_by_document_id(user_id, document.document_id)
-            if not existing_session:
-                break
-        
-        # If similar document exists and user has no existing session
-        if len(similar_documents) and not existing_session:
-            conversation = [
-                {"role": "user", "content": "Uploaded document"},
-                {"role": "assistant", "content": "Similar document already exists. Contact admin for more information."}
-            ]
-            redis_service.save_conversation(session_id, conversation)
-            session_service.create_session(user_id, session_id, type='upload', document_id=document_id, document_info=extracted_info)
-            session_service.update_session_messages(session_id, conversation, title=document_info.get('chat_title'))
-            return {
-                "session_id": session_id,
-                "message": "Similar document already exists. Contact admin for more information.",
-            }
-
-        # If similar document exists and user has existing session, redirect to existing session
-        if existing_session:
-            conversation = [
-                {"role": "user", "content": "Uploaded document"},
-                {"role": "assistant", "content": "Similar document already exists."}
-            ]
-            redis_service.save_conversation(session_id, conversation)
-            session_service.create_session(user_id, session_id, type='upload', document_id=document_id, document_info=extracted_info)
-            session_service.update_session_messages(session_id, conversation, title=document_info.get('chat_title'))
-            logger.info(f"Similar document already exists - User: {user_id}, "f"Document ID: {document_id}")
-            return {
-                "session_id": existing_session.session_id,
-                "document_id": existing_session.document_id,
-                "message": "Similar document already exists."
-            }
-
-        # Storing document information in Redis
-        redis_service.save_previous_info(session_id, extracted_info)
-        redis_service.save_document_id(session_id, document_id)
-
-        conversation = [
-            {"role": "user", "content": "Uploaded document"},
-            {"role": "assistant", "content": document_info.get('message')}
-        ]
-        redis_service.save_conversation(session_id, conversation)
-
-        # Storing session information in MongoDB
-        session_service.create_session(user_id, session_id, type='upload', document_id=document_id, document_info=extracted_info)
-        session_service.update_session_messages(session_id, conversation, title=document_info.get('chat_title'))
+    content, content_hash, size = await spool_upload(file)
+    logger.info(f"File received - User: {user_id}, Size: {size}, Hash: {content_hash}")
 
-        logger.info(f"File processed successfully - User: {user_id}, "f"Document ID: {document_id}")
+    try:
+        job_id = job_service.submit_upload(user_id, session_id, file.filename, content, content_hash)
         return {
+            "job_id": job_id,
             "session_id": session_id,
-            "document_id": document_id,
-            "extracted_info": extracted_info,
-            "message": document_info.get('message')
+            "status": "queued"
         }
 
     except Exception as e:
+        content.close()
+        logger.error(f"Upload failed - User: {user_id}, Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@upload_router.post("/upload/stream")
+async def upload_file_stream(
+    file: UploadFile = File(...),
+    authorization: str = Header(...),
+    session_id: Optional[str] = Header(None)
+):
+    """
+    Same pipeline as /upload, reported as server-sent events: received, stage,
+    page, timings, then complete (carrying the /upload result) or error.
+    Disconnecting does not stop the job; it can still be polled with the job_id
+    from the received event.
+    """
+    user_id = await get_user_id(authorization)
+    logger.info(f"Streaming file upload request - User: {user_id}, "f"File: {file.filename}, Session: {session_id}")
+
+    if not session_id:
+        session_id = str(uuid.uuid4())
+
+    content_type = file.content_type
+    if content_type not in ALLOWED_MIMETYPES:
+        raise HTTPException(status_code=400, detail=f"File type not allowed. Allowed types: {', '.join(ALLOWED_MIMETYPES.values())}")
+
+    content, content_hash, size = await spool_upload(file)
+    logger.info(f"File received - User: {user_id}, Size: {size}, Hash: {content_hash}")
+
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def on_event(event: str, data: Dict[str, Any]):
+        # Called from the job's worker thread
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    try:
+        job_id = job_service.submit_upload(user_id, session_id, file.filename, content, content_hash, on_event=on_event)
+    except Exception as e:
+        content.close()
         logger.error(f"Upload failed - User: {user_id}, Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def stream() -> AsyncIterator[str]:
+        yield format_sse("received", {"job_id": job_id, "session_id": session_id, "size": size})
+        deadline = loop.time() + settings.UPLOAD_STREAM_TIMEOUT
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                # The job keeps running; the client can poll /upload/jobs/{job_id}
+                yield format_sse("error", {"error": "Timed out waiting for the upload job", "job_id": job_id})
+                break
+            try:
+                event, data = await asyncio.wait_for(events.get(), timeout=min(settings.UPLOAD_STREAM_KEEPALIVE, remaining))
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield format_sse(event, data)
+            if event in ("complete", "error"):
+                break
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@upload_router.get("/upload/jobs/{job_id}")
+async def get_upload_job(job_id: str, authorization: str = Header(...)):
+    user_id = await get_user_id(authorization)
+    job = job_service.get_job(job_id)
+    if not job or job.get("user_id") != user_id:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return {
+        "job_id": job_id,
+        "session_id": job.get("session_id"),
+        "status": job.get("status"),
+        "stage": job.get("stage"),
+        "result": job.get("result"),
+        "error": job.get("error")
+    }
+
 @upload_router.post("/upload_chat")
 async def chat_with_document(
     request: ChatRequest, 
@@ -172,7 +206,7 @@ async def chat_with_document(
         previous_info = redis_service.get_previous_info(session_id)
         document_id = redis_service.get_document_id(session_id)
 
-        response = xai_service.chat_with_document(user_message=request.message, conversation=conversation, document_info=previous_info)
+        response = await xai_service.achat_with_document(user_message=request.message, conversation=conversation, document_info=previous_info)
 
         if response.get("consent"):
             try: 
@@ -187,7 +221,7 @@ async def chat_with_document(
                         del loan_document_dict['_id']
                     document_service.update_document(document_id, loan_document_dict)
 
-                upsert_embedding(document_id, user_id, response_data['extracted_info'])
+                await run_in_threadpool(upsert_embedding, document_id, user_id, response_data['extracted_info'])
                 logger.info(f"Document upload completed - User: {user_id}, "f"Document: {document_id}")
 
             except Exception as e:
@@ -0,0 +1,379 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from databases.redis import Redis
+from utils.logger import setup_logger
+
+logger = setup_logger('cache')
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+class OCRCache:
+    """Content-addressed store of OCR results, keyed by the hash of the image bytes"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        text = self._get(key)
+        with self._stats_lock:
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return text
+
+    def set(self, key: str, text: str):
+        try:
+            self._set(key, text)
+        except Exception as e:
+            logger.warning(f"Failed to cache OCR result: {str(e)}")
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def _set(self, key: str, text: str):
+        raise NotImplementedError
+
+
+class LocalOCRCache(OCRCache):
+    """
+    On-disk cache, one file per entry. The file mtime is the LRU clock:
+    hits touch the file and past max_entries the oldest files are evicted
+    down to a low-water mark, so the directory scan runs once per batch of
+    new entries rather than on every write.
+    """
+
+    LOW_WATER_RATIO = 0.9
+
+    def __init__(self, directory: str, max_entries: int):
+        super().__init__()
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = len(list(self.directory.glob("*.txt")))
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.txt"
+
+    def _get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            text = path.read_text(encoding="utf-8")
+            os.utime(path)
+            return text
+        except (FileNotFoundError, OSError):
+            return None
+
+    def _set(self, key: str, text: str):
+        path = self._path(key)
+        with self._lock:
+            is_new = not path.exists()
+            temp_path = path.with_suffix(".tmp")
+            temp_path.write_text(text, encoding="utf-8")
+            os.replace(temp_path, path)
+            if is_new:
+                self._entries += 1
+            if self._entries > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        paths = sorted(self.directory.glob("*.txt"), key=lambda p: p.stat().st_mtime)
+        low_water = int(self.max_entries * self.LOW_WATER_RATIO)
+        excess = len(paths) - low_water
+        for path in paths[:max(0, excess)]:
+            path.unlink(missing_ok=True)
+        self._entries = min(len(paths), low_water)
+
+
+class RedisOCRCache(OCRCache):
+    """
+    Redis cache shared by all workers. A sorted set of last-access times is
+    the LRU index and hit/miss counters are kept in a hash.
+    """
+
+    PREFIX = "ocr_cache"
+
+    def __init__(self, max_entries: int, ttl: int):
+        super().__init__()
+        self.redis_client = Redis().connect()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lru_key = f"{self.PREFIX}:lru"
+        self.stats_key = f"{self.PREFIX}:stats"
+
+    def get(self, key: str) -> Optional[str]:
+        text = super().get(key)
+        try:
+            self.redis_client.hincrby(self.stats_key, "misses" if text is None else "hits", 1)
+        except Exception as e:
+            logger.warning(f"Failed to update OCR cache stats: {str(e)}")
+        return text
+
+    def _get(self, key: str) -> Optional[str]:
+        try:
+            text = self.redis_client.get(f"{self.PREFIX}:{key}")
+            if text is not None:
+                self.redis_client.zadd(self.lru_key, {key: time.time()})
+            return text
+        except Exception as e:
+            logger.warning(f"Failed to read OCR cache: {str(e)}")
+            return None
+
+    def _set(self, key: str, text: str):
+        pipeline = self.redis_client.pipeline()
+        pipeline.setex(f"{self.PREFIX}:{key}", self.ttl, text)
+        pipeline.zadd(self.lru_key, {key: time.time()})
+        pipeline.zcard(self.lru_key)
+        entries = pipeline.execute()[-1]
+
+        if entries > self.max_entries:
+            evicted = self.redis_client.zpopmin(self.lru_key, entries - self.max_entries)
+            if evicted:
+                self.redis_client.delete(*[f"{self.PREFIX}:{evicted_key}" for evicted_key, _ in evicted])
+
+    def stats(self) -> Dict[str, int]:
+        stats = self.redis_client.hgetall(self.stats_key)
+        return {
+            "hits": int(stats.get("hits", 0)),
+            "misses": int(stats.get("misses", 0)),
+            "entries": self.redis_client.zcard(self.lru_key),
+        }
+
+
+def get_ocr_cache() -> Optional[OCRCache]:
+    backend = settings.OCR_CACHE_BACKEND.lower()
+    if backend == "local":
+        return LocalOCRCache(settings.OCR_CACHE_DIR, settings.OCR_CACHE_MAX_ENTRIES)
+    if backend == "redis":
+        return RedisOCRCache(settings.OCR_CACHE_MAX_ENTRIES, settings.OCR_CACHE_TTL)
+    return None
+
+
+def llm_cache_key(*parts, casefold: bool = False) -> str:
+    """
+    Normalized hash of an LLM request. Whitespace is collapsed so trivially
+    different spacing of the same message shares a key.
+    Args:
+        casefold: Also ignore case; only safe when the response does not echo values from the message
+    """
+    def normalize(value):
+        if isinstance(value, str):
+            value = " ".join(value.split())
+            return value.casefold() if casefold else value
+        if isinstance(value, (list, tuple)):
+            return [normalize(item) for item in value]
+        if isinstance(value, dict):
+            return {key: normalize(item) for key, item in sorted(value.items())}
+        return value
+
+    return content_hash(json.dumps(normalize(list(parts)), sort_keys=True).encode("utf-8"))
+
+
+class LLMResponseCache:
+    """
+    Redis exact-match cache of structured LLM responses for one call type.
+    Entries expire after ttl; past max_entries the least recently used are
+    evicted through a sorted set of access times. Hit/miss counters are kept
+    in a hash so every worker reports the same hit rate.
+    """
+
+    PREFIX = "llm_cache"
+
+    def __init__(self, namespace: str, max_entries: int, ttl: int):
+        self.redis_client = Redis().connect()
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.key_prefix = f"{self.PREFIX}:{namespace}"
+        self.lru_key = f"{self.key_prefix}:lru"
+        self.stats_key = f"{self.key_prefix}:stats"
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            value = self.redis_client.get(f"{self.key_prefix}:{key}")
+            pipeline = self.redis_client.pipeline()
+            if value is not None:
+                pipeline.zadd(self.lru_key, {key: time.time()})
+            pipeline.hincrby(self.stats_key, "misses" if value is None else "hits", 1)
+            pipeline.execute()
+            return json.loads(value) if value is not None else None
+        except Exception as e:
+            logger.warning(f"Failed to read {self.namespace} cache: {str(e)}")
+            return None
+
+    def set(self, key: str, value: Any):
+        try:
+            pipeline = self.redis_client.pipeline()
+            pipeline.setex(f"{self.key_prefix}:{key}", self.ttl, json.dumps(value, default=str))
+            pipeline.zadd(self.lru_key, {key: time.time()})
+            pipeline.zcard(self.lru_key)
+            entries = pipeline.execute()[-1]
+
+            if entries > self.max_entries:
+                evicted = self.redis_client.zpopmin(self.lru_key, entries - self.max_entries)
+                if evicted:
+                    self.redis_client.delete(*[f"{self.key_prefix}:{evicted_key}" for evicted_key, _ in evicted])
+        except Exception as e:
+            logger.warning(f"Failed to cache {self.namespace} response: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.redis_client.hgetall(self.stats_key)
+        hits = int(stats.get("hits", 0))
+        misses = int(stats.get("misses", 0))
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "entries": self.redis_client.zcard(self.lru_key),
+        }
+
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class SemanticAnswerCache:
+    """
+    Redis cache of generated /kv-chat answers. Entries are grouped into buckets
+    by intent and the set of retrieved document ids; a lookup returns the
+    bucket's most similar entry when its query embedding is within the
+    similarity threshold. Each referenced document has a version counter that
+    DocumentService bumps on every write, which drops the buckets referencing it
+    and makes any entry stored against an older version a miss.
+    """
+
+    PREFIX = "answer_cache"
+
+    def __init__(self, threshold: float, max_entries_per_bucket: int, ttl: int):
+        self.redis_client = Redis().connect()
+        self.threshold = threshold
+        self.max_entries_per_bucket = max_entries_per_bucket
+        self.ttl = ttl
+        self.stats_key = f"{self.PREFIX}:stats"
+
+    def _bucket_key(self, intent: str, document_ids: List[str]) -> str:
+        bucket = content_hash(json.dumps([intent, sorted(set(document_ids))]).encode("utf-8"))
+        return f"{self.PREFIX}:bucket:{bucket}"
+
+    def document_versions(self, document_ids: List[str]) -> Dict[str, int]:
+        """Current version of each document, read right after retrieval so an answer is stored against the versions it was generated from"""
+        document_ids = sorted(set(document_ids))
+        try:
+            versions = self.redis_client.mget([f"{self.PREFIX}:version:{document_id}" for document_id in document_ids])
+        except Exception as e:
+            logger.warning(f"Failed to read answer cache versions: {str(e)}")
+            versions = [None] * len(document_ids)
+        return {document_id: int(version or 0) for document_id, version in zip(document_ids, versions)}
+
+    def get(self, embedding: List[float], intent: str, document_ids: List[str], versions: Dict[str, int]) -> Optional[Dict]:
+        """
+        Most similar cached answer for the same intent and retrieved documents
+        Returns:
+            Optional[Dict]: The cached generate_response result, or None below the similarity threshold
+        """
+        bucket_key = self._bucket_key(intent, document_ids)
+        best, best_similarity = None, 0.0
+        try:
+            entry_ids = self.redis_client.zrevrange(bucket_key, 0, -1)
+            entries = self.redis_client.mget([f"{self.PREFIX}:entry:{entry_id}" for entry_id in entry_ids]) if entry_ids else []
+            stale = []
+            for entry_id, entry in zip(entry_ids, entries):
+                if entry is None:
+                    stale.append(entry_id)
+                    continue
+                entry = json.loads(entry)
+                if entry["versions"] != versions:
+                    stale.append(entry_id)
+                    continue
+                similarity = cosine_similarity(embedding, entry["embedding"])
+                if similarity > best_similarity:
+                    best, best_similarity = entry, similarity
+            if stale:
+                self.redis_client.zrem(bucket_key, *stale)
+        except Exception as e:
+            logger.warning(f"Failed to read answer cache: {str(e)}")
+
+        hit = best is not None and best_similarity >= self.threshold
+        try:
+            self.redis_client.hincrby(self.stats_key, "hits" if hit else "misses", 1)
+        except Exception as e:
+            logger.warning(f"Failed to update answer cache stats: {str(e)}")
+        if hit:
+            logger.info(f"Answer cache hit - Similarity: {best_similarity:.4f}")
+            return best["response"]
+        return None
+
+    def set(self, embedding: List[float], intent: str, document_ids: List[str], versions: Dict[str, int], response: Dict):
+        bucket_key = self._bucket_key(intent, document_ids)
+        entry_id = uuid.uuid4().hex
+        entry = {"embedding": embedding, "versions": versions, "response": response}
+        try:
+            pipeline = self.redis_client.pipeline()
+            pipeline.setex(f"{self.PREFIX}:entry:{entry_id}", self.ttl, json.dumps(entry, default=str))
+            pipeline.zadd(bucket_key, {entry_id: time.time()})
+            # Keep only the newest entries of the bucket
+            pipeline.zremrangebyrank(bucket_key, 0, -(self.max_entries_per_bucket + 1))
+            pipeline.expire(bucket_key, self.ttl)
+            for document_id in versions:
+                pipeline.sadd(f"{self.PREFIX}:document:{document_id}", bucket_key)
+                pipeline.expire(f"{self.PREFIX}:document:{document_id}", self.ttl)
+            pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Failed to cache answer: {str(e)}")
+
+    def invalidate(self, document_id: str):
+        """Drop every cached answer that referenced the document"""
+        try:
+            document_key = f"{self.PREFIX}:document:{document_id}"
+            bucket_keys = self.redis_client.smembers(document_key)
+            pipeline = self.redis_client.pipeline()
+            pipeline.incr(f"{self.PREFIX}:version:{document_id}")
+            if bucket_keys:
+                pipeline.delete(*bucket_keys)
+            pipeline.delete(document_key)
+            pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Failed to invalidate answer cache for document {document_id}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.redis_client.hgetall(self.stats_key)
+        hits = int(stats.get("hits", 0))
+        misses = int(stats.get("misses", 0))
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """The process-wide /kv-chat answer cache, or None when ANSWER_CACHE_ENABLED is off"""
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    return SemanticAnswerCache(
+        settings.ANSWER_CACHE_THRESHOLD,
+        settings.ANSWER_CACHE_MAX_PER_BUCKET,
+        settings.ANSWER_CACHE_TTL,
+    )
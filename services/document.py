@@ -1,6 +1,7 @@
 from typing import List, Optional
 from databases.mongo import MongoDB
 from models.document import LoanDocument
+from services.cache import get_answer_cache
 
 class DocumentService:
     def __init__(self):
@@ -15,10 +16,12 @@ class DocumentService:
             ("property_type", "text"),
             ("loan_terms", "text")
         ])
+        self.answer_cache = get_answer_cache()
 
     def store_document(self, document: LoanDocument) -> LoanDocument:
         loan_document = document.to_dict()
         self.loan_documents.insert_one(loan_document)
+        self._invalidate_answers(document.document_id)
         return document
 
     def get_document_by_id(self, document_id: str) -> Optional[LoanDocument]:
@@ -32,12 +35,18 @@ class DocumentService:
             {"document_id": document_id},
             {"$set": updates}
         )
+        self._invalidate_answers(document_id)
         return result.modified_count > 0
 
     def delete_document(self, document_id: str) -> bool:
         result = self.loan_documents.delete_one({"document_id": document_id})
+        self._invalidate_answers(document_id)
         return result.deleted_count > 0
         
+    def _invalidate_answers(self, document_id: str):
+        if self.answer_cache:
+            self.answer_cache.invalidate(document_id)
+
     def search_documents(self, query: dict) -> list[LoanDocument]:
         documents = self.loan_documents.find(query)
         return [doc for doc in list(documents)]
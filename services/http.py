@@ -0,0 +1,103 @@
+import importlib.util
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+
+from config import settings
+from utils.logger import setup_logger
+
+logger = setup_logger('http')
+
+
+class XAIHttpPool:
+    """
+    Process-wide HTTP connection pool for all api.x.ai traffic. OCR, embedding
+    and completion clients share one sync and one async httpx client, so
+    keep-alive connections are reused across them and the socket count per
+    worker is capped by XAI_HTTP_MAX_CONNECTIONS.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(XAIHttpPool, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._client = None
+            cls._instance._async_client = None
+            cls._instance._requests = 0
+        return cls._instance
+
+    def __init__(self):
+        self.limits = httpx.Limits(
+            max_connections=settings.XAI_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.XAI_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.XAI_HTTP_KEEPALIVE_EXPIRY,
+        )
+        # HTTP/2 needs the optional h2 package
+        self.http2 = settings.XAI_HTTP2 and importlib.util.find_spec("h2") is not None
+
+    @property
+    def client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                if settings.XAI_HTTP2 and not self.http2:
+                    logger.warning("h2 is not installed, xAI HTTP pool falls back to HTTP/1.1")
+                self._client = httpx.Client(
+                    limits=self.limits,
+                    http2=self.http2,
+                    event_hooks={"request": [self._count_request]},
+                )
+            return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._async_client is None:
+                self._async_client = httpx.AsyncClient(
+                    limits=self.limits,
+                    http2=self.http2,
+                    event_hooks={"request": [self._acount_request]},
+                )
+            return self._async_client
+
+    def _count_request(self, request: httpx.Request):
+        with self._lock:
+            self._requests += 1
+
+    async def _acount_request(self, request: httpx.Request):
+        self._count_request(request)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Connection pool utilization
+        Returns:
+            Dict[str, Any]: Request count, limits and per-client connection counts (total, active, idle)
+        """
+        return {
+            "requests": self._requests,
+            "http2": self.http2,
+            "max_connections": settings.XAI_HTTP_MAX_CONNECTIONS,
+            "max_keepalive_connections": settings.XAI_HTTP_MAX_KEEPALIVE,
+            "sync": self._connection_stats(self._client),
+            "async": self._connection_stats(self._async_client),
+        }
+
+    def _connection_stats(self, client: Optional[Any]) -> Optional[Dict[str, int]]:
+        # httpx does not expose its pool; read httpcore's connection list when available
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is None:
+            return None
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {"connections": len(connections), "active": len(connections) - idle, "idle": idle}
+
+    async def aclose(self):
+        """Close both clients and their pooled connections"""
+        with self._lock:
+            client, self._client = self._client, None
+            async_client, self._async_client = self._async_client, None
+        if client is not None:
+            client.close()
+        if async_client is not None:
+            await async_client.aclose()
@@ -0,0 +1,238 @@
+import threading
+import uuid
+from typing import BinaryIO, Callable, Dict, Any, Optional, Union
+
+from config import settings
+from models.document import LoanDocument
+from models.upload import UploadRecord
+from services.document import DocumentService
+from services.pipeline import IncrementalExtraction, RelevanceSpeculation, is_confidently_irrelevant
+from services.processor import DocumentProcessor
+from services.redis import RedisService
+from services.session import SessionService
+from services.upload_index import UploadIndexService
+from services.xai import XAICompletion
+from utils.logger import setup_logger
+
+logger = setup_logger('ingestion')
+
+
+class IngestionService:
+    """The /upload pipeline: text extraction, relevance check, data extraction and duplicate handling"""
+
+    def __init__(self):
+        self.processor = DocumentProcessor()
+        self.document_service = DocumentService()
+        self.session_service = SessionService()
+        self.redis_service = RedisService()
+        self.xai_service = XAICompletion()
+        self.upload_index = UploadIndexService()
+
+    def ingest(
+        self,
+        user_id: str,
+        session_id: str,
+        filename: str,
+        content: Union[bytes, BinaryIO],
+        content_hash: Optional[str] = None,
+        on_stage: Optional[Callable[[str], None]] = None,
+        on_page: Optional[Callable[[int, str, bool], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run the upload pipeline for a document
+        Args:
+            user_id: Uploading user
+            session_id: Upload chat session
+            filename: Original file name, used to pick the extractor
+            content: File content or a file-like object holding it
+            content_hash: sha256 of the content; a previously extracted file with the same hash is reused without OCR or LLM calls
+            on_stage: Called with the stage name as each stage starts
+            on_page: Called with (page_number, text, ocr) as each PDF page's text becomes available
+        Returns:
+            Dict[str, Any]: The /upload response payload
+        """
+        def stage(name: str):
+            if on_stage:
+                on_stage(name)
+
+        document_id = str(uuid.uuid4())
+
+        record = self.upload_index.get_record(content_hash) if content_hash else None
+        if record:
+            stage("reuse")
+            previous_session = self.session_service.get_session(user_id, record.session_id)
+            if previous_session:
+                logger.info(f"Identical upload, reusing session - User: {user_id}, "f"Session: {previous_session.session_id}")
+                return self._reuse_session(previous_session, record)
+            logger.info(f"Identical upload, reusing extraction - User: {user_id}, "f"Document ID: {record.document_id}")
+            document_info = record.document_info
+        else:
+            # Processing document
+            stage("processing")
+            # Page consumers see pages as they are OCR'd; speculation and incremental extraction can stop the OCR early
+            cancel = threading.Event()
+            consumers = [on_page] if on_page else []
+            speculation = None
+            incremental = None
+            if settings.RELEVANCE_SPECULATION_PAGES > 0:
+                speculation = RelevanceSpeculation(self.xai_service, settings.RELEVANCE_SPECULATION_PAGES, cancel)
+                consumers.append(speculation.on_page)
+            if settings.EXTRACTION_INCREMENTAL_PAGES > 0:
+                incremental = IncrementalExtraction(
+                    self.xai_service,
+                    settings.EXTRACTION_INCREMENTAL_PAGES,
+                    settings.EXTRACTION_INCREMENTAL_MAX_ATTEMPTS,
+                    settings.EXTRACTION_EARLY_STOP_COVERAGE,
+                    cancel,
+                    speculation=speculation,
+                )
+                consumers.append(incremental.on_page)
+
+            def handle_page(page_number: int, page_text: str, ocr: bool):
+                for consumer in consumers:
+                    consumer(page_number, page_text, ocr)
+
+            try:
+                text = self.processor.process_document(
+                    content,
+                    filename,
+                    on_page=handle_page if consumers else None,
+                    cancel=cancel,
+                )
+            finally:
+                relevancy = speculation.result() if speculation else None
+                # A rejected document is returned without waiting on an extraction in flight
+                document_info = incremental.result(wait=not is_confidently_irrelevant(relevancy)) if incremental else None
+            if is_confidently_irrelevant(relevancy):
+                logger.info(f"Document rejected before OCR completed - User: {user_id}, "f"File: {filename}")
+                return {
+                    "session_id": session_id,
+                    "message": "The document is not relevant",
+                    "confidence": relevancy.get('confidence')
+                }
+            if not text:
+                logger.info(f"Failed to extract text from document - User: {user_id}, "f"File: {filename}")
+                return {
+                    "session_id": session_id,
+                    "message": "Failed to extract text from document"
+                }
+
+            # Long documents are extracted chunk by chunk, after a sampled relevance check.
+            # A speculative verdict of relevant_document skips straight to extraction.
+            if document_info is None and relevancy is None and settings.UPLOAD_COMBINED_LLM_CALL and not self.xai_service.is_long_document(text):
+                # Relevance and extraction in one call
+                stage("extraction")
+                document_info = self.xai_service.check_and_ingest_document(text)
+                if document_info.get('document_type') == 'irrelevant_document':
+                    return {
+                        "session_id": session_id,
+                        "message": "The document is not relevant",
+                        "confidence": document_info.get('confidence')
+                    }
+                if not document_info.get('extracted_info'):
+                    logger.info(f"Combined call returned no extraction, retrying extraction - User: {user_id}")
+                    document_info = self.xai_service.ingest_document(text)
+            else:
+                # Check document relevance, re-checking the full text when the speculative check was not sure
+                if relevancy is None or relevancy.get('document_type') == 'irrelevant_document':
+                    stage("relevance")
+                    relevancy = self.xai_service.check_relevance(text)
+                    if relevancy.get('document_type') == 'irrelevant_document':
+                        return {
+                            "session_id": session_id,
+                            "message": "The document is not relevant",
+                            "confidence": relevancy.get('confidence')
+                        }
+
+                # Extract document information, unless incremental extraction already stopped OCR early
+                if document_info is None:
+                    stage("extraction")
+                    document_info = self.xai_service.ingest_document(text)
+
+        extracted_info = document_info.get('extracted_info')
+
+        # Check if document already exists based on company name
+        stage("dedup")
+        similar_documents = self.document_service.find_similar_documents(LoanDocument(**extracted_info))
+
+        # Check if the user has an existing session with all similar documents
+        existing_session = None
+        for document_data in similar_documents:
+            document = LoanDocument.from_dict(document_data)
+            existing_session = self.session_service.get_session_by_document_id(user_id, document.document_id)
+            if not existing_session:
+                break
+
+        # If similar document exists and user has no existing session
+        if len(similar_documents) and not existing_session:
+            conversation = [
+                {"role": "user", "content": "Uploaded document"},
+                {"role": "assistant", "content": "Similar document already exists. Contact admin for more information."}
+            ]
+            self.redis_service.save_conversation(session_id, conversation)
+            self.session_service.create_session(user_id, session_id, type='upload', document_id=document_id, document_info=extracted_info)
+            self.session_service.update_session_messages(session_id, conversation, title=document_info.get('chat_title'))
+            return {
+                "session_id": session_id,
+                "message": "Similar document already exists. Contact admin for more information.",
+            }
+
+        # If similar document exists and user has existing session, redirect to existing session
+        if existing_session:
+            conversation = [
+                {"role": "user", "content": "Uploaded document"},
+                {"role": "assistant", "content": "Similar document already exists."}
+            ]
+            self.redis_service.save_conversation(session_id, conversation)
+            self.session_service.create_session(user_id, session_id, type='upload', document_id=document_id, document_info=extracted_info)
+            self.session_service.update_session_messages(session_id, conversation, title=document_info.get('chat_title'))
+            logger.info(f"Similar document already exists - User: {user_id}, "f"Document ID: {document_id}")
+            return {
+                "session_id": existing_session.session_id,
+                "document_id": existing_session.document_id,
+                "message": "Similar document already exists."
+            }
+
+        # Storing document information in Redis
+        stage("saving")
+        self.redis_service.save_previous_info(session_id, extracted_info)
+        self.redis_service.save_document_id(session_id, document_id)
+
+        conversation = [
+            {"role": "user", "content": "Uploaded document"},
+            {"role": "assistant", "content": document_info.get('message')}
+        ]
+        self.redis_service.save_conversation(session_id, conversation)
+
+        # Storing session information in MongoDB
+        self.session_service.create_session(user_id, session_id, type='upload', document_id=document_id, document_info=extracted_info)
+        self.session_service.update_session_messages(session_id, conversation, title=document_info.get('chat_title'))
+
+        # Only uploads that reached this point are indexed for reuse; sessions blocked by
+        # the company-name dedup above must never have their Redis state restored
+        if content_hash and not record:
+            self.upload_index.save_record(UploadRecord(content_hash, user_id, session_id, document_id, document_info))
+
+        logger.info(f"File processed successfully - User: {user_id}, "f"Document ID: {document_id}")
+        return {
+            "session_id": session_id,
+            "document_id": document_id,
+            "extracted_info": extracted_info,
+            "message": document_info.get('message')
+        }
+
+    def _reuse_session(self, session, record: UploadRecord) -> Dict[str, Any]:
+        """Point the client back at its earlier session for the same file, restoring its Redis state"""
+        document_info = session.document_info or record.document_info.get('extracted_info')
+        self.redis_service.save_previous_info(session.session_id, document_info)
+        self.redis_service.save_document_id(session.session_id, session.document_id)
+        if not self.redis_service.get_conversation(session.session_id):
+            conversation = [{"role": message.role, "content": message.content} for message in session.messages]
+            self.redis_service.save_conversation(session.session_id, conversation)
+
+        return {
+            "session_id": session.session_id,
+            "document_id": session.document_id,
+            "extracted_info": document_info,
+            "message": record.document_info.get('message')
+        }
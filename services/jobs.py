@@ -0,0 +1,143 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, BinaryIO, Callable, Dict, Optional
+
+from config import settings
+from services.ingestion import IngestionService
+from services.redis import RedisService
+from utils.logger import setup_logger
+
+logger = setup_logger('jobs')
+
+
+class JobService:
+    """
+    Runs /upload pipelines on a background worker pool. Job state lives in
+    Redis so any API worker can answer status polls.
+    """
+
+    def __init__(self):
+        self.redis_service = RedisService()
+        self.ingestion_service = IngestionService()
+        self.executor = ThreadPoolExecutor(max_workers=settings.UPLOAD_JOB_WORKERS, thread_name_prefix="upload-job")
+        self._lock = threading.Lock()
+
+    def submit_upload(
+        self,
+        user_id: str,
+        session_id: str,
+        filename: str,
+        content: BinaryIO,
+        content_hash: str,
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ) -> str:
+        """
+        Queue an upload job. The job takes ownership of `content` and closes it when done.
+        Args:
+            on_event: Called from the worker thread with (event, data) for each stage
+                ("stage"), OCR'd page ("page"), the per-stage timings ("timings") and
+                finally the result ("complete") or failure ("error")
+        Returns:
+            str: Job id
+        """
+        job_id = str(uuid.uuid4())
+        now = datetime.utcnow().timestamp()
+        self.redis_service.save_upload_job(job_id, {
+            "job_id": job_id,
+            "user_id": user_id,
+            "session_id": session_id,
+            "filename": filename,
+            "content_hash": content_hash,
+            "status": "queued",
+            "stage": None,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        })
+        self.executor.submit(self._run_upload, job_id, user_id, session_id, filename, content, content_hash, on_event)
+        logger.info(f"Upload job queued - Job: {job_id}, User: {user_id}, File: {filename}")
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        return self.redis_service.get_upload_job(job_id)
+
+    def update_job(self, job_id: str, **fields):
+        # Only this process writes a given job, the lock keeps its stage updates ordered
+        with self._lock:
+            job = self.redis_service.get_upload_job(job_id) or {"job_id": job_id}
+            job.update(fields, updated_at=datetime.utcnow().timestamp())
+            self.redis_service.save_upload_job(job_id, job)
+
+    def _run_upload(
+        self,
+        job_id: str,
+        user_id: str,
+        session_id: str,
+        filename: str,
+        content: BinaryIO,
+        content_hash: str,
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ):
+        started = time.perf_counter()
+        timings = {}
+        current = {"stage": None, "started": started}
+
+        def emit(event: str, data: Dict[str, Any]):
+            if not on_event:
+                return
+            try:
+                on_event(event, data)
+            except Exception as e:
+                logger.warning(f"Upload job event listener failed - Job: {job_id}, Error: {str(e)}")
+
+        def finish_stage():
+            now = time.perf_counter()
+            if current["stage"]:
+                timings[current["stage"]] = round(now - current["started"], 3)
+            return now
+
+        def on_stage(stage: str):
+            now = finish_stage()
+            current.update(stage=stage, started=now)
+            self.update_job(job_id, stage=stage)
+            emit("stage", {"stage": stage, "elapsed": round(now - started, 3)})
+
+        def on_page(page_number: int, text: str, ocr: bool):
+            emit("page", {
+                "page": page_number,
+                "ocr": ocr,
+                "characters": len(text),
+                "elapsed": round(time.perf_counter() - started, 3),
+            })
+
+        terminal = ("error", {"error": "Upload job did not complete"})
+        try:
+            self.update_job(job_id, status="processing")
+            result = self.ingestion_service.ingest(
+                user_id,
+                session_id,
+                filename,
+                content,
+                content_hash=content_hash,
+                on_stage=on_stage,
+                on_page=on_page if on_event else None,
+            )
+            self.update_job(job_id, status="completed", stage=None, result=result)
+            terminal = ("complete", result)
+            logger.info(f"Upload job completed - Job: {job_id}, User: {user_id}")
+        except Exception as e:
+            logger.error(f"Upload job failed - Job: {job_id}, User: {user_id}, Error: {str(e)}")
+            terminal = ("error", {"error": str(e)})
+            try:
+                self.update_job(job_id, status="failed", error=str(e))
+            except Exception as update_error:
+                logger.error(f"Failed to record upload job failure - Job: {job_id}, Error: {str(update_error)}")
+        finally:
+            content.close()
+            # Listeners wait for a terminal event, so it is sent whatever happened above
+            emit("timings", {"stages": timings, "total": round(finish_stage() - started, 3)})
+            emit(*terminal)
@@ -0,0 +1,107 @@
+from typing import Dict, NamedTuple, Optional
+
+from config import settings
+from services.pool import ProcessPool
+from services.xai import XAIVision
+from utils.logger import setup_logger
+from utils.tesseract import tesseract_ocr
+
+logger = setup_logger('ocr')
+
+
+class OCRResult(NamedTuple):
+    text: str
+    confidence: Optional[float]
+    engine: str
+
+
+class OCRBackend:
+    name = "base"
+
+    def ocr(self, image_bytes: bytes) -> OCRResult:
+        raise NotImplementedError
+
+    def image_stats(self) -> Dict[str, Dict]:
+        """Image preparation stats of the vision OCR calls made by this backend"""
+        return {}
+
+
+class VisionOCR(OCRBackend):
+    """Remote grok-2-vision OCR"""
+
+    name = "vision"
+
+    def __init__(self):
+        self.llm = XAIVision()
+
+    def ocr(self, image_bytes: bytes) -> OCRResult:
+        return OCRResult(self.llm.ocr(image_bytes), None, self.name)
+
+    def image_stats(self) -> Dict[str, Dict]:
+        return self.llm.image_stats()
+
+
+class TesseractOCR(OCRBackend):
+    """Local Tesseract OCR, run in the shared process pool"""
+
+    name = "tesseract"
+
+    def __init__(self, lang: str = "eng"):
+        self.lang = lang
+        self.pool = ProcessPool()
+
+    def ocr(self, image_bytes: bytes) -> OCRResult:
+        # The tesseract timeout frees the worker; the pool timeout only bounds the wait
+        text, confidence = self.pool.run(
+            tesseract_ocr,
+            image_bytes,
+            self.lang,
+            settings.OCR_TESSERACT_TIMEOUT,
+            timeout=settings.OCR_TESSERACT_TIMEOUT + 5,
+        )
+        return OCRResult(text, confidence, self.name)
+
+
+class EscalatingOCR(OCRBackend):
+    """
+    Try a cheap local backend first and escalate to the vision model when the
+    local result is low confidence or nearly empty.
+    """
+
+    name = "auto"
+
+    def __init__(self, primary: OCRBackend, fallback: OCRBackend, min_confidence: float, min_chars: int):
+        self.primary = primary
+        self.fallback = fallback
+        self.min_confidence = min_confidence
+        self.min_chars = min_chars
+
+    def ocr(self, image_bytes: bytes) -> OCRResult:
+        try:
+            result = self.primary.ocr(image_bytes)
+            characters = len("".join(result.text.split()))
+            if result.confidence is not None and result.confidence >= self.min_confidence and characters >= self.min_chars:
+                return result
+            logger.info(
+                f"Escalating OCR to {self.fallback.name} - Confidence: {result.confidence}, Characters: {characters}"
+            )
+        except Exception as e:
+            logger.warning(f"{self.primary.name} OCR failed, escalating to {self.fallback.name}: {str(e)}")
+        return self.fallback.ocr(image_bytes)
+
+    def image_stats(self) -> Dict[str, Dict]:
+        return {**self.primary.image_stats(), **self.fallback.image_stats()}
+
+
+def get_ocr_backend() -> OCRBackend:
+    backend = settings.OCR_BACKEND.lower()
+    if backend == "tesseract":
+        return TesseractOCR(settings.OCR_TESSERACT_LANG)
+    if backend == "auto":
+        return EscalatingOCR(
+            TesseractOCR(settings.OCR_TESSERACT_LANG),
+            VisionOCR(),
+            min_confidence=settings.OCR_TESSERACT_MIN_CONFIDENCE,
+            min_chars=settings.OCR_TESSERACT_MIN_CHARS,
+        )
+    return VisionOCR()
@@ -0,0 +1,193 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+
+from services.xai import XAICompletion
+from utils.extraction import REQUIRED_FIELDS, field_coverage, is_missing
+from utils.logger import setup_logger
+
+logger = setup_logger('pipeline')
+
+
+def is_confidently_irrelevant(relevancy: Optional[Dict]) -> bool:
+    return (
+        bool(relevancy)
+        and relevancy.get('document_type') == 'irrelevant_document'
+        and str(relevancy.get('confidence', '')).lower() == 'high'
+    )
+
+
+class RelevanceSpeculation:
+    """
+    Classify relevance from the first pages of a document while the remaining
+    pages are still being OCR'd. A High confidence irrelevant_document verdict
+    sets `cancel`, which stops the OCR of the rest of the document. Only OCR'd
+    pages start the check: text-layer pages are all available up front, and a
+    document without OCR is better served by the combined relevance and
+    extraction call on its full text.
+    """
+
+    def __init__(self, xai_service: XAICompletion, min_pages: int, cancel: Optional[threading.Event] = None):
+        self.xai_service = xai_service
+        self.min_pages = min_pages
+        self.cancel = cancel or threading.Event()
+        self._pages: Dict[int, str] = {}
+        self._ocr_pages = 0
+        self._lock = threading.Lock()
+        self._future: Optional[Future] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="relevance")
+
+    def on_page(self, page_number: int, text: str, ocr: bool):
+        """Page callback for DocumentProcessor.process_document; starts the check once min_pages OCR'd pages have text"""
+        with self._lock:
+            if self._future is not None or not text.strip():
+                return
+            self._pages[page_number] = text
+            if ocr:
+                self._ocr_pages += 1
+            if self._ocr_pages < self.min_pages:
+                return
+            # check_relevance samples the text down to its token budget
+            sample = "\n".join(self._pages[number] for number in sorted(self._pages))
+            logger.info(f"Speculative relevance check started - Pages: {sorted(self._pages)}")
+            self._future = self._executor.submit(self._classify, sample)
+
+    def _classify(self, text: str) -> Dict:
+        relevancy = self.xai_service.check_relevance(text)
+        if is_confidently_irrelevant(relevancy):
+            logger.info("Speculative relevance check rejected the document, cancelling OCR")
+            self.cancel.set()
+        return relevancy
+
+    def allows_extraction(self) -> bool:
+        """Whether incremental extraction may spend a call: the check returned relevant_document or has not started"""
+        with self._lock:
+            future = self._future
+        if future is None:
+            return True
+        if not future.done():
+            return False
+        try:
+            return future.result().get('document_type') == 'relevant_document'
+        except Exception:
+            return False
+
+    def result(self) -> Optional[Dict]:
+        """
+        Wait for the speculative check
+        Returns:
+            Optional[Dict]: CheckRelevance fields, or None if the check never started or failed
+        """
+        try:
+            if self._future is None:
+                return None
+            return self._future.result()
+        except Exception as e:
+            logger.warning(f"Speculative relevance check failed: {str(e)}")
+            return None
+        finally:
+            self._executor.shutdown(wait=False)
+
+
+class IncrementalExtraction:
+    """
+    Extract from the leading run of pages every `step` pages while the rest are
+    still being OCR'd. Once an extraction has every required field, or fills at
+    least `coverage` of all fields, `cancel` is set so the remaining pages are
+    not OCR'd and that extraction is used for the document. Text-layer pages
+    fill in the leading run but never start an extraction on their own, since
+    a document without OCR already has its full text. With a `speculation`,
+    no extraction is submitted until it has returned relevant_document, so
+    rejected uploads spend no extraction tokens.
+    """
+
+    def __init__(
+        self,
+        xai_service: XAICompletion,
+        step: int,
+        max_attempts: int,
+        coverage: float,
+        cancel: Optional[threading.Event] = None,
+        speculation: Optional[RelevanceSpeculation] = None,
+    ):
+        self.xai_service = xai_service
+        self.speculation = speculation
+        self.step = step
+        self.max_attempts = max_attempts
+        self.coverage = coverage
+        self.cancel = cancel or threading.Event()
+        self._pages: Dict[int, str] = {}
+        self._ocr_page_numbers = set()
+        self._extracted_pages = 0
+        self._attempts = 0
+        self._lock = threading.Lock()
+        self._future: Optional[Future] = None
+        self._result: Optional[Dict] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="extraction")
+
+    def on_page(self, page_number: int, text: str, ocr: bool):
+        """Page callback for DocumentProcessor.process_document"""
+        with self._lock:
+            self._pages[page_number] = text
+            if not ocr:
+                return
+            self._ocr_page_numbers.add(page_number)
+            if self._result is not None or self._attempts >= self.max_attempts:
+                return
+            if self._future is not None and not self._future.done():
+                return
+
+            # Only the contiguous run from page 1 keeps the text in document order
+            leading = 0
+            while leading + 1 in self._pages:
+                leading += 1
+            if leading - self._extracted_pages < self.step:
+                return
+            if not any(number in self._ocr_page_numbers for number in range(self._extracted_pages + 1, leading + 1)):
+                return
+            # Checked on every later page, so a deferred attempt starts once the verdict is in
+            if self.speculation and not self.speculation.allows_extraction():
+                return
+
+            text = "\n".join(self._pages[number] for number in range(1, leading + 1))
+            if not text.strip():
+                return
+            self._extracted_pages = leading
+            self._attempts += 1
+            logger.info(f"Incremental extraction started - Pages: 1-{leading}, Attempt: {self._attempts}")
+            self._future = self._executor.submit(self._extract, text, leading)
+
+    def _extract(self, text: str, pages: int) -> Dict:
+        document_info = self.xai_service.ingest_document(text)
+        extracted_info = document_info.get('extracted_info') or {}
+        required_filled = all(not is_missing(extracted_info.get(field)) for field in REQUIRED_FIELDS)
+        coverage = field_coverage(extracted_info)
+        if required_filled or coverage >= self.coverage:
+            logger.info(
+                f"Incremental extraction complete, stopping OCR - Pages: 1-{pages}, "
+                f"Required fields: {required_filled}, Coverage: {coverage:.2f}"
+            )
+            with self._lock:
+                self._result = document_info
+            self.cancel.set()
+        return document_info
+
+    def result(self, wait: bool = True) -> Optional[Dict]:
+        """
+        The extraction that met the threshold, waiting for one still in flight
+        when OCR finished first
+        Args:
+            wait: False abandons an extraction still in flight, e.g. once the document was rejected
+        Returns:
+            Optional[Dict]: UploadDocument fields, or None when no extraction met the
+            threshold and the full text should be extracted instead
+        """
+        try:
+            if wait and self._future is not None:
+                self._future.result()
+        except Exception as e:
+            logger.warning(f"Incremental extraction failed: {str(e)}")
+        finally:
+            self._executor.shutdown(wait=False)
+        with self._lock:
+            return self._result
@@ -0,0 +1,70 @@
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from config import settings
+from utils.logger import setup_logger
+
+logger = setup_logger('pool')
+
+
+class ProcessPool:
+    """
+    Process-wide pool for CPU-bound work (image preparation, page fingerprints,
+    Tesseract, DOCX/CSV parsing). After max_tasks submissions the executor is
+    swapped for a fresh one; the old one finishes its queued work and exits,
+    which recycles worker processes on Python versions without max_tasks_per_child.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ProcessPool, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._executor = None
+            cls._instance._submitted = 0
+        return cls._instance
+
+    def __init__(self):
+        self.enabled = settings.PROCESS_POOL_ENABLED
+        self.max_workers = settings.PROCESS_POOL_WORKERS
+        self.max_tasks = settings.PROCESS_POOL_MAX_TASKS
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None or self._submitted >= self.max_tasks:
+            if self._executor is not None:
+                logger.info(f"Recycling process pool after {self._submitted} tasks")
+                self._executor.shutdown(wait=False)
+            # The pool is created lazily from worker threads; forking a threaded process can
+            # copy held locks into the child, so workers come from a clean forkserver instead
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+            self._submitted = 0
+        return self._executor
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        with self._lock:
+            try:
+                future = self._get_executor().submit(fn, *args, **kwargs)
+            except BrokenProcessPool:
+                logger.warning("Process pool broken, restarting")
+                self._executor = None
+                future = self._get_executor().submit(fn, *args, **kwargs)
+            self._submitted += 1
+            return future
+
+    def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run fn in the pool and wait for its result, or inline when the pool is disabled"""
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result(timeout=timeout)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
@@ -1,59 +1,342 @@
-from pdf2image import convert_from_path
-from pathlib import Path
-from docx import Document
-import pandas as pd
-from typing import Dict, Any
-import tempfile
-import os
+from typing import BinaryIO, Callable, Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import subprocess
+import string
+import threading
+import time
 from config import settings
-from services.xai import XAIVision
+from services.ocr import get_ocr_backend
+from services.pool import ProcessPool
+from utils.logger import setup_logger
+from utils.parsers import decode_text, parse_csv, parse_docx
+from utils.image import PageFingerprint, hamming_distance, page_fingerprint, thumbnail_difference
+from utils.pdf import page_size_points, pdf_info, pdf_text_pages, render_pdf_pages
 
-llm = XAIVision()
+ocr_backend = get_ocr_backend()
+process_pool = ProcessPool()
+logger = setup_logger('processor')
 
 class DocumentProcessor:
-    def process_document(self, file_content: bytes, filename: str) -> str:
+    def process_document(
+        self,
+        file_content: Union[bytes, BinaryIO],
+        filename: str,
+        on_page: Optional[Callable[[int, str, bool], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> str:
+        """
+        Extract the text of a document
+        Args:
+            file_content: File content or a file-like object holding it
+            filename: Original file name, used to pick the extractor
+            on_page: Called with (page_number, text, ocr) as each PDF page's text becomes available;
+                ocr is False for pages read from the embedded text layer
+            cancel: When set, PDF page OCR stops and the text extracted so far is returned
+        Returns:
+            str: Document text
+        """
         file_extension = filename.split('.')[-1].lower()
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_extension}") as temp_file:
-            temp_file.write(file_content)
-            temp_file_path = temp_file.name
-        
-        try:
-            if file_extension == 'pdf':
-                text = self._process_pdf(temp_file_path)
-            elif file_extension in ['png', 'jpg', 'jpeg']:
-                text = self._process_image(temp_file_path)
-            elif file_extension == 'csv':
-                text = self._process_csv(temp_file_path)
-            elif file_extension == 'docx':
-                text = self._process_docx(temp_file_path)
-            else:
-                raise ValueError(f"Unsupported file format: {file_extension}")
-        finally:
-            os.unlink(temp_file_path)
-            
+
+        # Spooled uploads are only materialized here, when the job actually runs
+        if not isinstance(file_content, bytes):
+            file_content.seek(0)
+            file_content = file_content.read()
+
+        if file_extension == 'pdf':
+            text = self._process_pdf(file_content, on_page, cancel)
+        elif file_extension in ['png', 'jpg', 'jpeg']:
+            text = self._process_image(file_content)
+        elif file_extension == 'csv':
+            text = self._process_csv(file_content)
+        elif file_extension == 'docx':
+            text = self._process_docx(file_content)
+        elif file_extension == 'doc':
+            text = self._process_doc(file_content)
+        elif file_extension == 'txt':
+            text = self._process_txt(file_content)
+        else:
+            raise ValueError(f"Unsupported file format: {file_extension}")
+
         return text
-    
-    def _process_pdf(self, file_path: str) -> str:
-        pages = convert_from_path(file_path)
-        extracted_text = ""
 
-        with tempfile.TemporaryDirectory() as temp_dir:
-            for i, page in enumerate(pages):
-                temp_image_path = Path(temp_dir) / f"page_{i + 1}.png"
-                page.save(temp_image_path, "PNG")
-                extracted_text += llm.ocr(temp_image_path)
+    def _process_pdf(
+        self,
+        file_content: bytes,
+        on_page: Optional[Callable[[int, str, bool], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> str:
+        info = pdf_info(file_content)
+        page_count = info["Pages"]
+        page_texts = self._extract_text_layer(file_content, page_count)
+        ocr_page_numbers = [
+            page_number for page_number, text in enumerate(page_texts, start=1)
+            if not self._has_usable_text(text)
+        ]
+        logger.info(
+            f"PDF text layer - Pages: {page_count}, Native: {page_count - len(ocr_page_numbers)}, "
+            f"OCR: {len(ocr_page_numbers)}"
+        )
+        if on_page:
+            for page_number, text in enumerate(page_texts, start=1):
+                if page_number not in ocr_page_numbers:
+                    on_page(page_number, text, False)
 
+        if ocr_page_numbers:
+            dpi = self._render_dpi(info)
+            logger.info(f"PDF rasterization - DPI: {dpi}")
+            pages = self._iter_pdf_pages(file_content, ocr_page_numbers, dpi)
+            on_ocr_page = (lambda page_number, text: on_page(page_number, text, True)) if on_page else None
+            ocr_texts = self._ocr_pages(pages, on_ocr_page, cancel)
+            for page_number, text in ocr_texts.items():
+                page_texts[page_number - 1] = text
+
+        return "\n".join(page_texts)
+
+    def _extract_text_layer(self, file_content: bytes, page_count: int) -> List[str]:
+        """
+        Extract the embedded text of every page
+        Returns:
+            List[str]: Text per page, empty strings when the PDF has no text layer
+        """
+        if not settings.PDF_TEXT_LAYER:
+            return [""] * page_count
+        try:
+            return pdf_text_pages(file_content, page_count, timeout=settings.PDF_TEXT_TIMEOUT)
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning(f"Failed to extract PDF text layer, falling back to OCR: {str(e)}")
+            return [""] * page_count
+
+    def _has_usable_text(self, text: str) -> bool:
+        characters = "".join(text.split())
+        if len(characters) < settings.PDF_TEXT_MIN_CHARS:
+            return False
+        readable = sum(1 for c in characters if c.isalnum() or c in string.punctuation)
+        return readable / len(characters) >= settings.PDF_TEXT_MIN_READABLE_RATIO
+
+    def _render_dpi(self, info: Dict[str, Any]) -> int:
+        """
+        Pick the render DPI so the page's longest side lands near OCR_IMAGE_MAX_EDGE
+        pixels, clamped to [PDF_MIN_DPI, PDF_DPI]
+        """
+        page_size = page_size_points(info)
+        if not page_size or not settings.OCR_IMAGE_PREPARE:
+            return settings.PDF_DPI
+        dpi = int(settings.OCR_IMAGE_MAX_EDGE * 72 / max(page_size))
+        return max(settings.PDF_MIN_DPI, min(settings.PDF_DPI, dpi))
+
+    def _iter_pdf_pages(self, file_content: bytes, page_numbers: List[int], dpi: int) -> Iterator[Tuple[int, bytes]]:
+        """
+        Rasterize the given PDF pages a small window at a time
+        Args:
+            file_content: PDF content
+            page_numbers: 1-based page numbers to render, in ascending order
+            dpi: Render resolution
+        Returns:
+            Iterator[Tuple[int, bytes]]: (page_number, PNG bytes) in page order
+        """
+        for first_page, last_page in self._page_windows(page_numbers):
+            images = render_pdf_pages(
+                file_content,
+                first_page,
+                last_page,
+                dpi=dpi,
+                thread_count=settings.PDF_THREAD_COUNT,
+            )
+            for offset, image in enumerate(images):
+                yield first_page + offset, image
+
+    def _page_windows(self, page_numbers: List[int]) -> Iterator[Tuple[int, int]]:
+        """Group page numbers into contiguous (first_page, last_page) runs of at most PDF_PAGE_WINDOW pages"""
+        window = max(1, settings.PDF_PAGE_WINDOW)
+        first_page = last_page = None
+        for page_number in page_numbers:
+            if first_page is not None and page_number == last_page + 1 and page_number - first_page < window:
+                last_page = page_number
+                continue
+            if first_page is not None:
+                yield first_page, last_page
+            first_page = last_page = page_number
+        if first_page is not None:
+            yield first_page, last_page
+
+    def _process_image(self, file_content: bytes) -> str:
+        extracted_text = ocr_backend.ocr(file_content).text
         return extracted_text
-    
-    def _process_image(self, file_path: str) -> str:
-        extracted_text = llm.ocr(file_path)
-        return extracted_text
-    
-    def _process_csv(self, file_path: str) -> str:
-        df = pd.read_csv(file_path)
-        return df.to_string()
-    
-    def _process_docx(self, file_path: str) -> str:
-        doc = Document(file_path)
-        return " ".join([paragraph.text for paragraph in doc.paragraphs])
+
+    def _process_csv(self, file_content: bytes) -> str:
+        text, rows, truncated = process_pool.run(
+            parse_csv,
+            file_content,
+            settings.CSV_CHUNK_ROWS,
+            settings.CSV_MAX_TOKENS,
+            settings.CSV_PRUNE_EMPTY_COLUMNS,
+        )
+        if truncated:
+            logger.info(f"CSV truncated to {settings.CSV_MAX_TOKENS} tokens - Rows: {rows}")
+        return text
+
+    def _process_docx(self, file_content: bytes) -> str:
+        return process_pool.run(parse_docx, file_content)
+
+    def _process_doc(self, file_content: bytes) -> str:
+        # catdoc reads legacy Word binaries from stdin; -w disables line wrapping
+        result = subprocess.run(
+            ["catdoc", "-w", "-d", "utf-8"],
+            input=file_content,
+            capture_output=True,
+            timeout=settings.DOC_TEXT_TIMEOUT,
+            check=True,
+        )
+        return result.stdout.decode("utf-8", errors="replace").strip()
+
+    def _process_txt(self, file_content: bytes) -> str:
+        return process_pool.run(decode_text, file_content)
+
+    def _ocr_pages(
+        self,
+        pages: Iterable[Tuple[int, bytes]],
+        on_page: Optional[Callable[[int, str], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Dict[int, str]:
+        """
+        OCR pages concurrently on a bounded worker pool. Pages are pulled from
+        `pages` only when a worker is free, so a lazy rasterizer never runs
+        more than one window ahead of OCR. Blank pages are skipped and
+        near-identical pages reuse the text of the first occurrence.
+        Args:
+            pages: (page_number, image bytes) pairs in page order
+            on_page: Called with (page_number, text) as each page completes
+            cancel: Checked between pages; once set no further pages are started and
+                pages still in flight are abandoned
+        Returns:
+            Dict[int, str]: OCR text by page number, only for the pages that completed
+        """
+        started = time.perf_counter()
+        max_workers = max(1, settings.OCR_MAX_WORKERS)
+        results = {}
+        in_flight = set()
+        seen = []
+        duplicates = {}
+        # original page -> duplicate pages still waiting for its text, for on_page
+        waiting = {}
+        blank_pages = 0
+
+        cancelled = False
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr")
+        try:
+            for page_number, image in pages:
+                if cancel is not None and cancel.is_set():
+                    cancelled = True
+                    break
+                fingerprint = self._fingerprint(page_number, image)
+                if fingerprint:
+                    if settings.OCR_SKIP_BLANK_PAGES and fingerprint.stddev <= settings.OCR_BLANK_MAX_STDDEV:
+                        results[page_number] = ("", 0.0)
+                        blank_pages += 1
+                        if on_page:
+                            on_page(page_number, "")
+                        continue
+                    original = self._find_duplicate(fingerprint, seen)
+                    if original is not None:
+                        duplicates[page_number] = original
+                        if on_page and original in results:
+                            on_page(page_number, results[original][0])
+                        elif on_page:
+                            waiting.setdefault(original, []).append(page_number)
+                        continue
+                    seen.append((page_number, fingerprint))
+
+                if len(in_flight) >= max_workers:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    self._collect_pages(done, results, on_page, waiting)
+                in_flight.add(executor.submit(self._ocr_page, page_number, image))
+            while in_flight and not cancelled:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                self._collect_pages(done, results, on_page, waiting)
+                cancelled = cancel is not None and cancel.is_set()
+        finally:
+            # A cancelled run does not wait for the pages still being OCR'd
+            executor.shutdown(wait=not cancelled)
+
+        for page_number, original in duplicates.items():
+            if original in results:
+                results[page_number] = (results[original][0], 0.0)
+
+        if cancelled:
+            logger.info(f"OCR cancelled - Pages completed: {len(results)}, Abandoned: {len(in_flight)}")
+        if not results:
+            return {}
+
+        latencies = [latency for _, latency in results.values()]
+        logger.info(
+            f"OCR completed - Pages: {len(results)}, Workers: {max_workers}, "
+            f"Total: {time.perf_counter() - started:.2f}s, Slowest page: {max(latencies):.2f}s, "
+            f"OCR calls avoided: {blank_pages + len(duplicates)} (Blank: {blank_pages}, Duplicate: {len(duplicates)})"
+        )
+        return {page_number: results[page_number][0] for page_number in sorted(results)}
+
+    def _fingerprint(self, page_number: int, image: bytes):
+        if not (settings.OCR_SKIP_BLANK_PAGES or settings.OCR_DEDUPE_PAGES):
+            return None
+        try:
+            return process_pool.run(page_fingerprint, image)
+        except Exception as e:
+            logger.warning(f"Failed to fingerprint page {page_number}: {str(e)}")
+            return None
+
+    def _find_duplicate(self, fingerprint: PageFingerprint, seen: List[Tuple[int, PageFingerprint]]):
+        """Page number of an earlier page that looks the same, confirmed on the thumbnail to rule out hash collisions"""
+        if not settings.OCR_DEDUPE_PAGES:
+            return None
+        for page_number, candidate in seen:
+            if (
+                hamming_distance(fingerprint.hash, candidate.hash) <= settings.OCR_DUPLICATE_MAX_DISTANCE
+                and thumbnail_difference(fingerprint.thumbnail, candidate.thumbnail) <= settings.OCR_DUPLICATE_MAX_DIFFERENCE
+            ):
+                return page_number
+        return None
+
+    def _collect_pages(
+        self,
+        futures,
+        results: Dict[int, Tuple[str, float]],
+        on_page: Optional[Callable[[int, str], None]] = None,
+        waiting: Optional[Dict[int, List[int]]] = None,
+    ):
+        for future in futures:
+            page_number, text, latency = future.result()
+            results[page_number] = (text, latency)
+            if on_page:
+                on_page(page_number, text)
+                # Duplicates of this page share its text
+                for duplicate in (waiting or {}).pop(page_number, []):
+                    on_page(duplicate, text)
+
+    def _ocr_page(self, page_number: int, image: bytes) -> Tuple[int, str, float]:
+        """
+        OCR a single page, retrying only this page on failure
+        Returns:
+            Tuple[int, str, float]: (page_number, text, latency in seconds of the successful attempt)
+        """
+        text, latency = self._ocr_with_retry(page_number, image)
+        return page_number, text, latency
+
+    def _ocr_with_retry(self, page_number: int, image: bytes) -> Tuple[str, float]:
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.perf_counter()
+            try:
+                result = ocr_backend.ocr(image)
+                latency = time.perf_counter() - started
+                logger.info(
+                    f"OCR page {page_number} - Engine: {result.engine}, Confidence: {result.confidence}, "
+                    f"Attempt: {attempt}, Latency: {latency:.2f}s"
+                )
+                return result.text, latency
+            except Exception as e:
+                if attempt > settings.OCR_MAX_RETRIES:
+                    logger.error(f"OCR page {page_number} failed after {attempt} attempts: {str(e)}")
+                    raise
+                logger.warning(f"OCR page {page_number} attempt {attempt} failed, retrying: {str(e)}")
+                time.sleep(settings.OCR_RETRY_BACKOFF * attempt)
@@ -138,3 +138,14 @@ class RedisService:
             3600,  # 1 hour expiry
             json.dumps(messages)
         )
+
+    def save_upload_job(self, job_id: str, job: Dict):
+        self.redis_client.setex(
+            f"upload_job:{job_id}",
+            settings.UPLOAD_JOB_TTL,
+            json.dumps(job, default=str)
+        )
+
+    def get_upload_job(self, job_id: str) -> Optional[Dict]:
+        job = self.redis_client.get(f"upload_job:{job_id}")
+        return json.loads(job) if job else None
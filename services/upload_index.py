@@ -0,0 +1,24 @@
+from typing import Optional
+from databases.mongo import MongoDB
+from models.upload import UploadRecord
+
+class UploadIndexService:
+    """Maps the content hash of an uploaded file to its stored extraction"""
+
+    def __init__(self):
+        self.client = MongoDB().connect()
+        self.upload_index = self.client.get_collection('upload_index')
+        self.upload_index.create_index("content_hash", unique=True)
+
+    def get_record(self, content_hash: str) -> Optional[UploadRecord]:
+        data = self.upload_index.find_one({"content_hash": content_hash})
+        return UploadRecord.from_dict(data) if data else None
+
+    def save_record(self, record: UploadRecord) -> bool:
+        # The first extraction of a file wins; later identical uploads reuse it
+        result = self.upload_index.update_one(
+            {"content_hash": record.content_hash},
+            {"$setOnInsert": record.to_dict()},
+            upsert=True
+        )
+        return result.upserted_id is not None
@@ -1,27 +1,111 @@
 from openai import OpenAI
+import json
 import logging
 import base64
 import os
-from typing import List, Dict
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple, Type
 from config import settings
 from langchain_openai import ChatOpenAI
 from langchain_core.utils.function_calling import convert_to_openai_function
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import Runnable
+from pydantic import BaseModel
 from langchain.output_parsers.openai_functions import PydanticOutputFunctionsParser
 
 from models.llm import *
 from utils.prompt import *
+from services.cache import LLMResponseCache, content_hash, get_ocr_cache, llm_cache_key
+from services.http import XAIHttpPool
+from services.pool import ProcessPool
+from utils.image import image_mime_type, prepare_image
+from utils.extraction import merge_extractions, missing_fields
+from utils.tokens import count_tokens, sample_text, split_text
 
 class XAIVision:
     def __init__(self):
         self.client = OpenAI(
             base_url="https://api.x.ai/v1", 
             api_key=settings.XAI_API_KEY,
+            http_client=XAIHttpPool().client,
         )
+        self.model = "grok-2-vision-1212"
+        self.cache = get_ocr_cache()
+        self.image_setting = (
+            f"{settings.OCR_IMAGE_FORMAT}/q{settings.OCR_IMAGE_QUALITY}-{settings.OCR_IMAGE_MIN_QUALITY}/"
+            f"{settings.OCR_IMAGE_MAX_EDGE}px/{'gray' if settings.OCR_IMAGE_GRAYSCALE else 'color'}/"
+            f"{settings.OCR_IMAGE_DETAIL}"
+        ) if settings.OCR_IMAGE_PREPARE else f"original/{settings.OCR_IMAGE_DETAIL}"
+        self.pool = ProcessPool()
+        self._image_stats = {}
+        self._image_stats_lock = threading.Lock()
         self.logger = logging.getLogger(__name__)
 
-    def ocr(self, image_path: str) -> str:
-        base64_image = self._encode_image(image_path)
+    def ocr(self, image_bytes: bytes) -> str:
+        # Model, prompt and image preparation are part of the key so changing any of them invalidates old results
+        cache_key = content_hash(image_bytes + f"{self.model}/{self.image_setting}".encode() + image_ocr_prompt.encode())
+        if self.cache:
+            cached_text = self.cache.get(cache_key)
+            if cached_text is not None:
+                # Process-local counters, so logging a hit costs no backend round trip
+                self.logger.info(f"OCR cache hit - Hits: {self.cache.hits}, Misses: {self.cache.misses}")
+                return cached_text
+
+        prepared_bytes, mime_type, quality = self._prepare_image(image_bytes)
+        started = time.perf_counter()
+        text = self._ocr(self._encode_image(prepared_bytes), mime_type)
+        latency = time.perf_counter() - started
+        self._record_image_stats(len(image_bytes), len(prepared_bytes), quality, latency)
+
+        if self.cache and text:
+            self.cache.set(cache_key, text)
+        return text
+
+    def image_stats(self) -> Dict[str, Dict]:
+        """Bytes saved and OCR latency aggregated per image preparation setting"""
+        with self._image_stats_lock:
+            return {
+                setting: {
+                    **stats,
+                    "bytes_saved": stats["original_bytes"] - stats["prepared_bytes"],
+                    "avg_latency": stats["latency"] / stats["calls"],
+                }
+                for setting, stats in self._image_stats.items()
+            }
+
+    def _prepare_image(self, image_bytes: bytes):
+        if not settings.OCR_IMAGE_PREPARE:
+            return image_bytes, image_mime_type(image_bytes), None
+        try:
+            return self.pool.run(
+                prepare_image,
+                image_bytes,
+                max_edge=settings.OCR_IMAGE_MAX_EDGE,
+                grayscale=settings.OCR_IMAGE_GRAYSCALE,
+                fmt=settings.OCR_IMAGE_FORMAT,
+                quality=settings.OCR_IMAGE_QUALITY,
+                min_quality=settings.OCR_IMAGE_MIN_QUALITY,
+                max_bytes=settings.OCR_IMAGE_MAX_BYTES,
+            )
+        except Exception as e:
+            self.logger.warning(f"Image preparation failed, sending original: {str(e)}")
+            return image_bytes, image_mime_type(image_bytes), None
+
+    def _record_image_stats(self, original_bytes: int, prepared_bytes: int, quality, latency: float):
+        setting = f"{self.image_setting}@q{quality}" if quality else f"{self.image_setting}@original"
+        with self._image_stats_lock:
+            stats = self._image_stats.setdefault(setting, {"calls": 0, "original_bytes": 0, "prepared_bytes": 0, "latency": 0.0})
+            stats["calls"] += 1
+            stats["original_bytes"] += original_bytes
+            stats["prepared_bytes"] += prepared_bytes
+            stats["latency"] += latency
+        self.logger.info(
+            f"OCR image - Setting: {setting}, Bytes: {original_bytes} -> {prepared_bytes}, Latency: {latency:.2f}s"
+        )
+
+    def _ocr(self, base64_image: str, mime_type: str) -> str:
         messages = [
             {
                 "role": "user",
@@ -29,8 +113,8 @@ class XAIVision:
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}",
-                            "detail": "high",
+                            "url": f"data:{mime_type};base64,{base64_image}",
+                            "detail": settings.OCR_IMAGE_DETAIL,
                         },
                     },
                     {
@@ -41,22 +125,21 @@ class XAIVision:
             },
         ]
         ocr_content = self.client.chat.completions.create(
-            model="grok-2-vision-1212",
+            model=self.model,
             messages=messages,
             temperature=0.01,
         )
         return ocr_content.choices[0].message.content
 
-    def _encode_image(self, image_path: str) -> str:
-        with open(image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
-        return encoded_string
+    def _encode_image(self, image_bytes: bytes) -> str:
+        return base64.b64encode(image_bytes).decode("utf-8")
 
 class XAIEmbedding():
     def __init__(self):
         self.client = OpenAI(
             base_url="https://api.x.ai/v1", 
-            api_key=settings.XAI_API_KEY)
+            api_key=settings.XAI_API_KEY,
+            http_client=XAIHttpPool().client)
         self.model = "v1"
         self.logger = logging.getLogger(__name__)
 
@@ -72,6 +155,60 @@ class XAIEmbedding():
             self.logger.error(f"Error creating embedding: {str(e)}")
             raise e
 
+# name: (system prompt, structured output model, whether the conversation is appended)
+CHAIN_SPECS: Dict[str, Tuple[str, Type[BaseModel], bool]] = {
+    "ingest_document": (data_extraction_prompt, UploadDocument, False),
+    "check_and_ingest_document": (relevance_and_extraction_prompt, CheckAndIngestDocument, False),
+    "check_relevance": (check_relevance_prompt, CheckRelevance, False),
+    "analyze_intent": (intent_anlyse_prompt, AnalyzeIntent, True),
+    "chat_with_document": (data_extraction_from_chat_prompt, UploadChat, True),
+    "query_from_chat": (features_from_chat_prompt, FeaturesFromChat, True),
+    "generate_response": (response_generation_prompt, Response, True),
+}
+
+class PromptChains:
+    """
+    Registry of prompt | structured-output chains, built once per process. The
+    system prompt templates and function schemas are compiled up front; the
+    conversation is passed per request through a "messages" placeholder, so it
+    is never parsed as a template.
+    """
+    _instance = None
+
+    def __new__(cls, model: ChatOpenAI):
+        if cls._instance is None:
+            instance = super(PromptChains, cls).__new__(cls)
+            instance._chains = {
+                name: instance._build(model, system_prompt, output_model, with_history)
+                for name, (system_prompt, output_model, with_history) in CHAIN_SPECS.items()
+            }
+            # Changes whenever a prompt or its output schema changes, invalidating cached responses
+            instance._versions = {
+                name: content_hash((system_prompt + json.dumps(output_model.model_json_schema(), sort_keys=True)).encode("utf-8"))[:16]
+                for name, (system_prompt, output_model, _) in CHAIN_SPECS.items()
+            }
+            cls._instance = instance
+        return cls._instance
+
+    def _build(self, model: ChatOpenAI, system_prompt: str, output_model: Type[BaseModel], with_history: bool) -> Runnable:
+        messages = [("system", system_prompt)]
+        if with_history:
+            messages.append(MessagesPlaceholder("messages"))
+        return ChatPromptTemplate.from_messages(messages) | model.with_structured_output(output_model)
+
+    def get(self, name: str) -> Runnable:
+        return self._chains[name]
+
+    def version(self, name: str) -> str:
+        return self._versions[name]
+
+def conversation_messages(conversation: Optional[List[Dict[str, str]]], message: str, window: Optional[int] = None) -> List[Tuple[str, str]]:
+    """The (role, content) history for a chain's "messages" placeholder, optionally limited to the last `window` messages, followed by the new user message"""
+    recent_messages = conversation or []
+    if window:
+        recent_messages = recent_messages[-window:]
+    return [(msg["role"], msg["content"]) for msg in recent_messages] + [("user", message)]
+
 class XAICompletion:
     def __init__(self):
         self.model = ChatOpenAI(
@@ -81,55 +218,171 @@ class XAICompletion:
                 max_retries=3, 
                 max_tokens=None, 
                 base_url="https://api.x.ai/v1", 
-                api_key=settings.XAI_API_KEY
+                api_key=settings.XAI_API_KEY,
+                http_client=XAIHttpPool().client,
+                http_async_client=XAIHttpPool().async_client,
             )
+        self.chains = PromptChains(self.model)
+        self.response_caches = {
+            name: LLMResponseCache(name, settings.LLM_CACHE_MAX_ENTRIES, settings.LLM_CACHE_TTL)
+            for name in ("analyze_intent", "query_from_chat")
+        } if settings.LLM_CACHE_ENABLED else {}
         self.logger = logging.getLogger(__name__)
 
     # upload
+    def is_long_document(self, document_text: str) -> bool:
+        """Whether the document is extracted chunk by chunk rather than in a single call"""
+        return settings.EXTRACTION_CHUNK_TOKENS > 0 and count_tokens(document_text) > settings.EXTRACTION_CHUNK_TOKENS
+
     def ingest_document(self, document_text: str):
+        if self.is_long_document(document_text):
+            return self._ingest_document_chunked(document_text)
+        return self._ingest_document(document_text)
+
+    def _ingest_document_chunked(self, document_text: str):
+        """
+        Map-reduce extraction: extract each token-bounded chunk concurrently and
+        merge the partial results in chunk order
+        Returns:
+            dict: UploadDocument fields for the whole document
+        """
+        chunks = split_text(document_text, settings.EXTRACTION_CHUNK_TOKENS, settings.EXTRACTION_CHUNK_OVERLAP)
+        self.logger.info(f"Extracting long document in {len(chunks)} chunks")
+
+        with ThreadPoolExecutor(max_workers=min(settings.EXTRACTION_MAX_WORKERS, len(chunks))) as executor:
+            partials = list(executor.map(self._ingest_document, chunks))
+
+        extracted_info = merge_extractions([partial.get("extracted_info") or {} for partial in partials])
+        missing = missing_fields(extracted_info)
+        message = "I've extracted the loan details from your document."
+        if missing:
+            message += f" The following details are missing: {', '.join(missing)}. Please provide them if available."
+        message += " Would you like to add this document to the knowledge base?"
+
+        return {
+            "extracted_info": extracted_info,
+            "message": message,
+            "chat_title": next((partial.get("chat_title") for partial in partials if partial.get("chat_title")), None),
+        }
+
+    def _ingest_document(self, document_text: str):
         try: 
-            prompt = ChatPromptTemplate.from_messages([("system", data_extraction_prompt)])
-            chain = prompt | self.model.with_structured_output(UploadDocument)
+            chain = self.chains.get("ingest_document")
             response = chain.invoke({"document_content": document_text})
             return response.model_dump()
         except Exception as e:
             self.logger.error(f"Error ingesting document: {str(e)}")
             raise e
 
+    def check_and_ingest_document(self, document_text: str):
+        """
+        Classify relevance and extract the document in a single call
+        Returns:
+            dict: CheckAndIngestDocument fields; extracted_info is None for irrelevant documents
+        """
+        try:
+            chain = self.chains.get("check_and_ingest_document")
+            response = chain.invoke({"document_content": document_text})
+            return response.model_dump()
+        except Exception as e:
+            self.logger.error(f"Error checking and ingesting document: {str(e)}")
+            raise e
+
     def check_relevance(self, document_text: str):
-        prompt = ChatPromptTemplate.from_messages([("system", check_relevance_prompt)])
-        chain = prompt | self.model.with_structured_output(CheckRelevance)
+        """
+        Classify a token-bounded sample of the document, re-checking the full
+        text only when the sample is classified with Low confidence
+        """
+        if settings.RELEVANCE_SAMPLE_TOKENS <= 0:
+            return self._check_relevance(document_text)
+
+        sample = sample_text(
+            document_text,
+            settings.RELEVANCE_SAMPLE_TOKENS,
+            head_ratio=settings.RELEVANCE_HEAD_RATIO,
+            chunk_tokens=settings.RELEVANCE_CHUNK_TOKENS,
+        )
+        response = self._check_relevance(sample)
+        if sample != document_text and str(response.get("confidence", "")).lower() == "low":
+            self.logger.info("Low confidence relevance on sample, re-checking full document")
+            response = self._check_relevance(document_text)
+        return response
+
+    def _check_relevance(self, document_text: str):
+        chain = self.chains.get("check_relevance")
         response = chain.invoke({"document_content": document_text})
         return response.model_dump()
 
-    def analyze_intent(self, conversation: List[Dict[str, str]], message: str):
+    def _analyze_intent_chain(self, conversation: List[Dict[str, str]], message: str):
+        return self.chains.get("analyze_intent"), {"messages": conversation_messages(conversation, message, window=10)}
 
-        recent_messages = conversation[-10:] if conversation else []
-        conversation_payload = [("system", intent_anlyse_prompt)]
+    def analyze_intent(self, conversation: List[Dict[str, str]], message: str, use_cache: bool = True):
+        chain, inputs = self._analyze_intent_chain(conversation, message)
+        return self._invoke_cached("analyze_intent", chain, inputs, use_cache)
 
-        if recent_messages:
-            conversation_payload.extend([(msg["role"], msg["content"]) for msg in recent_messages])
-        
-        conversation_payload.append(("user", message))
+    async def aanalyze_intent(self, conversation: List[Dict[str, str]], message: str, use_cache: bool = True):
+        chain, inputs = self._analyze_intent_chain(conversation, message)
+        return await self._ainvoke_cached("analyze_intent", chain, inputs, use_cache)
 
-        prompt = ChatPromptTemplate.from_messages(conversation_payload)
-        chain = prompt | self.model.with_structured_output(AnalyzeIntent)
-        response = chain.invoke({})
-        return response.model_dump()
+    def cache_stats(self) -> Dict[str, Dict]:
+        return {name: cache.stats() for name, cache in self.response_caches.items()}
+
+    def _response_cache_key(self, name: str, inputs: Dict) -> str:
+        # query_from_chat copies filter values from the message into exact Mongo matches, so only intents ignore case
+        return llm_cache_key(name, self.chains.version(name), self.model.model_name, inputs, casefold=name == "analyze_intent")
+
+    def _invoke_cached(self, name: str, chain: Runnable, inputs: Dict, use_cache: bool = True) -> Dict:
+        """
+        Invoke a chain through its exact-match response cache, if it has one
+        Args:
+            use_cache: False skips the cache lookup; the fresh response still replaces the cached one
+        """
+        cache = self.response_caches.get(name)
+        key = self._response_cache_key(name, inputs) if cache else None
+        if key and use_cache:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
+        response = chain.invoke(inputs).model_dump()
+        if key:
+            cache.set(key, response)
+        return response
+
+    async def _ainvoke_cached(self, name: str, chain: Runnable, inputs: Dict, use_cache: bool = True) -> Dict:
+        cache = self.response_caches.get(name)
+        key = self._response_cache_key(name, inputs) if cache else None
+        if key and use_cache:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
+        response = (await chain.ainvoke(inputs)).model_dump()
+        if key:
+            cache.set(key, response)
+        return response
 
     # upload chat 
+    def _chat_with_document_chain(self, user_message: str, conversation: List[Dict[str, str]], document_info: Dict[str, str]):
+        return self.chains.get("chat_with_document"), {
+            "extracted_info": document_info,
+            "messages": conversation_messages(conversation, user_message),
+        }
+
     def chat_with_document(self, user_message: str, conversation:  List[Dict[str, str]], document_info: Dict[str, str]):
         try:
-            conversation_payload = [("system", data_extraction_from_chat_prompt)]
-
-            if conversation:
-                conversation_payload.extend([(msg["role"], msg["content"]) for msg in conversation])
+            chain, inputs = self._chat_with_document_chain(user_message, conversation, document_info)
+            response = chain.invoke(inputs)
+            return response.model_dump()
 
-            conversation_payload.append(("user", user_message))
+        except Exception as e:
+            self.logger.error(f"Error chatting with document: {e}")
+            return {}
 
-            prompt = ChatPromptTemplate.from_messages(conversation_payload)
-            chain = prompt | self.model.with_structured_output(UploadChat)
-            response = chain.invoke({"extracted_info": document_info})
+    async def achat_with_document(self, user_message: str, conversation: List[Dict[str, str]], document_info: Dict[str, str]):
+        try:
+            chain, inputs = self._chat_with_document_chain(user_message, conversation, document_info)
+            response = await chain.ainvoke(inputs)
             return response.model_dump()
 
         except Exception as e:
@@ -137,20 +390,25 @@ class XAICompletion:
             return {}
 
     # kv chat
-    def query_from_chat(self, message:str, conversation: List[Dict[str, str]]):
+    def _query_from_chat_chain(self, message: str, conversation: List[Dict[str, str]]):
+        return self.chains.get("query_from_chat"), {"messages": conversation_messages(conversation, message, window=10)}
+
+    def query_from_chat(self, message:str, conversation: List[Dict[str, str]], use_cache: bool = True):
         try:
-            recent_messages = conversation[-10:] if conversation else []
-            conversation_payload = [("system", features_from_chat_prompt)]
+            chain, inputs = self._query_from_chat_chain(message, conversation)
+            response = self._invoke_cached("query_from_chat", chain, inputs, use_cache)
 
-            if recent_messages:
-                conversation_payload.extend([(msg["role"], msg["content"]) for msg in recent_messages])
+            query = self._construct_mongo_query(response.get("filters", []))
+            return query
 
-            conversation_payload.append(("user", message))
+        except Exception as e:
+            self.logger.error(f"Error extracting features from chat: {e}")
+            return {}
 
-            prompt = ChatPromptTemplate.from_messages(conversation_payload)
-            chain = prompt | self.model.with_structured_output(FeaturesFromChat)
-            response = chain.invoke({"messages": conversation_payload})
-            response = response.model_dump()
+    async def aquery_from_chat(self, message: str, conversation: List[Dict[str, str]], use_cache: bool = True):
+        try:
+            chain, inputs = self._query_from_chat_chain(message, conversation)
+            response = await self._ainvoke_cached("query_from_chat", chain, inputs, use_cache)
 
             query = self._construct_mongo_query(response.get("filters", []))
             return query
@@ -160,15 +418,28 @@ class XAICompletion:
             return {}
 
     # kv chat
+    def _generate_response_chain(self, intent: str, message: str, conversation: List[Dict[str, str]], kb_mongo_result: str, kb_pinecone_result: str):
+        return self.chains.get("generate_response"), {
+            "intent": intent,
+            "kb_mongo_result": kb_mongo_result,
+            "kb_pinecone_result": kb_pinecone_result,
+            "messages": conversation_messages(conversation, message),
+        }
+
     def generate_response(self, intent: str, message: str, conversation: List[Dict[str, str]], kb_mongo_result: str, kb_pinecone_result: str):
         try:
-            conversation_payload = [("system", response_generation_prompt)]
-            conversation_payload.extend([(msg["role"], msg["content"]) for msg in conversation])
-            conversation_payload.append(("user", message))
+            chain, inputs = self._generate_response_chain(intent, message, conversation, kb_mongo_result, kb_pinecone_result)
+            response = chain.invoke(inputs)
+            return response.model_dump()
 
-            prompt = ChatPromptTemplate.from_messages(conversation_payload)
-            chain = prompt | self.model.with_structured_output(Response)
-            response = chain.invoke({"intent": intent, "kb_mongo_result": kb_mongo_result, "kb_pinecone_result": kb_pinecone_result})
+        except Exception as e:
+            self.logger.error(f"Error generating response: {e}")
+            return {}
+
+    async def agenerate_response(self, intent: str, message: str, conversation: List[Dict[str, str]], kb_mongo_result: str, kb_pinecone_result: str):
+        try:
+            chain, inputs = self._generate_response_chain(intent, message, conversation, kb_mongo_result, kb_pinecone_result)
+            response = await chain.ainvoke(inputs)
             return response.model_dump()
 
         except Exception as e:
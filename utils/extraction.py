@@ -0,0 +1,110 @@
+from typing import Any, Dict, List, Optional
+
+# Deterministic merge of partial LoanDocument extractions from document chunks
+
+# Fields that, once filled, make further pages unlikely to change an extraction
+REQUIRED_FIELDS = ["company_name", "loan_amount", "ltv_ratio", "service_areas", "contact_information"]
+
+# String fields holding comma-separated lists (data_extraction_prompt), merged like list fields
+COMMA_SEPARATED_FIELDS = ["loan_plans"]
+
+
+def is_missing(value: Any) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return value.strip().lower() in ("", "missing", "none", "n/a")
+    if isinstance(value, list):
+        return all(is_missing(item) for item in value)
+    if isinstance(value, dict):
+        return all(is_missing(item) for item in value.values())
+    return False
+
+
+def _to_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        try:
+            number = float(value.replace(",", "").replace("$", "").replace("%", "").strip())
+        except ValueError:
+            return None
+        return int(number) if number.is_integer() else number
+    return None
+
+
+def _merge_range(values: List[dict]) -> dict:
+    """Widen a RangeValue: smallest min and largest max, falling back to the first non-missing value"""
+    merged = {}
+    for bound, pick in (("min", min), ("max", max)):
+        present = [value.get(bound) for value in values if not is_missing(value.get(bound))]
+        numbers = [number for number in (_to_number(item) for item in present) if number is not None]
+        if numbers:
+            merged[bound] = pick(numbers)
+        else:
+            merged[bound] = present[0] if present else "Missing"
+    return merged
+
+
+def _merge_list(values: List[list]) -> list:
+    merged = []
+    seen = set()
+    for value in values:
+        for item in value:
+            key = item.strip().lower() if isinstance(item, str) else item
+            if is_missing(item) or key in seen:
+                continue
+            seen.add(key)
+            merged.append(item)
+    return merged
+
+
+def _merge_dict(values: List[dict]) -> dict:
+    keys = []
+    for value in values:
+        keys.extend(key for key in value if key not in keys)
+    return {key: merge_values([value.get(key) for value in values]) for key in keys}
+
+
+def merge_values(values: List[Any]) -> Any:
+    present = [value for value in values if not is_missing(value)]
+    if not present:
+        return values[0] if values else None
+    if all(isinstance(value, dict) for value in present):
+        if all(set(value) <= {"min", "max"} for value in present):
+            return _merge_range(present)
+        return _merge_dict(present)
+    if all(isinstance(value, list) for value in present):
+        return _merge_list(present)
+    # Scalars: the earliest chunk that has a value wins
+    return present[0]
+
+
+def merge_extractions(partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge extracted_info dicts from document chunks, in chunk order
+    Returns:
+        Dict[str, Any]: Ranges widened, lists unioned and the first non-missing scalar kept
+    """
+    if not partials:
+        return {}
+    merged = _merge_dict(partials)
+    for field in COMMA_SEPARATED_FIELDS:
+        values = [partial.get(field) for partial in partials if isinstance(partial.get(field), str)]
+        items = _merge_list([[item.strip() for item in value.split(",")] for value in values if not is_missing(value)])
+        if items:
+            merged[field] = ", ".join(items)
+    return merged
+
+
+def missing_fields(extracted_info: Dict[str, Any]) -> List[str]:
+    return [field for field, value in extracted_info.items() if is_missing(value)]
+
+
+def field_coverage(extracted_info: Dict[str, Any]) -> float:
+    """Fraction of extracted fields that are not missing"""
+    if not extracted_info:
+        return 0.0
+    return 1 - len(missing_fields(extracted_info)) / len(extracted_info)
@@ -1,3 +1,5 @@
+from typing import List
+
 from services.embedding import _construct_vector_text
 
 def document_to_promptable(documents):
@@ -14,3 +16,18 @@ def document_to_promptable(documents):
         print(f"Error in document_to_promptable: {e}")
         return ""
 
+
+
+def retrieved_document_ids(mongo_documents, pinecone_result) -> List[str]:
+    """Sorted document ids behind a /kv-chat answer, from the Mongo results and the Pinecone match metadata"""
+    document_ids = {doc.get("document_id") for doc in mongo_documents or [] if doc.get("document_id")}
+    matches = getattr(pinecone_result, "matches", None)
+    if matches is None and isinstance(pinecone_result, dict):
+        matches = pinecone_result.get("matches")
+    for match in matches or []:
+        metadata = getattr(match, "metadata", None)
+        if metadata is None and isinstance(match, dict):
+            metadata = match.get("metadata")
+        if metadata and metadata.get("document_id"):
+            document_ids.add(metadata["document_id"])
+    return sorted(document_ids)
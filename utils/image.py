@@ -0,0 +1,99 @@
+import io
+from typing import NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageChops, ImageStat
+
+
+def prepare_image(
+    image_bytes: bytes,
+    max_edge: int = 2048,
+    grayscale: bool = True,
+    fmt: str = "JPEG",
+    quality: int = 85,
+    min_quality: int = 60,
+    max_bytes: int = 1_000_000,
+) -> Tuple[bytes, str, Optional[int]]:
+    """
+    Downscale, optionally grayscale and recompress an image for OCR upload.
+    Quality is stepped down towards min_quality until the result fits max_bytes.
+    Args:
+        image_bytes: Original image content
+        max_edge: Longest allowed side in pixels
+        grayscale: Convert to 8-bit grayscale
+        fmt: Output format, JPEG or WEBP
+        quality: Starting encoder quality
+        min_quality: Quality floor
+        max_bytes: Target upper bound for the encoded size
+    Returns:
+        Tuple[bytes, str, Optional[int]]: (image bytes, mime type, quality used). The
+        original bytes are returned with quality None if recompressing does not make them smaller.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    original_format = image.format
+    image.load()
+
+    if grayscale:
+        image = image.convert("L")
+    elif image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    if max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    while True:
+        buffer = io.BytesIO()
+        image.save(buffer, format=fmt, quality=quality, optimize=True)
+        prepared = buffer.getvalue()
+        if len(prepared) <= max_bytes or quality <= min_quality:
+            break
+        quality = max(min_quality, quality - 10)
+
+    if len(prepared) >= len(image_bytes) and original_format:
+        return image_bytes, Image.MIME.get(original_format, "image/png"), None
+    return prepared, f"image/{fmt.lower()}", quality
+
+
+def image_mime_type(image_bytes: bytes) -> str:
+    if image_bytes.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/png"
+
+
+class PageFingerprint(NamedTuple):
+    stddev: float
+    hash: int
+    thumbnail: Image.Image
+
+
+def page_fingerprint(image_bytes: bytes, hash_size: int = 16, thumbnail_size: int = 128) -> PageFingerprint:
+    """
+    Cheap pre-OCR page signature
+    Returns:
+        PageFingerprint: grayscale pixel standard deviation (near zero for blank pages),
+        a difference hash and a small grayscale thumbnail for verifying hash matches
+    """
+    image = Image.open(io.BytesIO(image_bytes)).convert("L")
+    stddev = ImageStat.Stat(image).stddev[0]
+
+    small = image.resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    page_hash = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            page_hash = (page_hash << 1) | (left > right)
+
+    thumbnail = image.resize((thumbnail_size, thumbnail_size), Image.BILINEAR)
+    return PageFingerprint(stddev, page_hash, thumbnail)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def thumbnail_difference(a: Image.Image, b: Image.Image) -> float:
+    """Mean absolute pixel difference (0-255) between two equally sized grayscale thumbnails"""
+    return ImageStat.Stat(ImageChops.difference(a, b)).mean[0]
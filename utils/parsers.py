@@ -0,0 +1,86 @@
+import io
+from typing import List, Tuple
+
+import pandas as pd
+from charset_normalizer import from_bytes
+from docx import Document
+
+from utils.tokens import count_tokens, count_tokens_batch
+
+# Module-level functions so they can be dispatched to the process pool
+
+
+def parse_docx(file_content: bytes) -> str:
+    doc = Document(io.BytesIO(file_content))
+    return " ".join([paragraph.text for paragraph in doc.paragraphs])
+
+
+def decode_text(file_content: bytes) -> str:
+    try:
+        return file_content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        match = from_bytes(file_content).best()
+        if match is None:
+            return file_content.decode("latin-1")
+        return str(match)
+
+
+def parse_csv(file_content: bytes, chunk_rows: int, max_tokens: int, prune_empty_columns: bool = True) -> Tuple[str, int, bool]:
+    """
+    Stream the CSV in row chunks into a compact pipe-delimited table,
+    stopping once max_tokens is reached
+    Returns:
+        Tuple[str, int, bool]: (table text, rows included, whether rows were dropped)
+    """
+    reader = pd.read_csv(
+        io.BytesIO(file_content),
+        chunksize=chunk_rows,
+        dtype=str,
+        keep_default_na=False,
+    )
+    lines = []
+    tokens = 0
+    rows = 0
+    columns = None
+    truncated = False
+
+    for chunk in reader:
+        if columns is None:
+            columns = _csv_columns(chunk, prune_empty_columns)
+            lines.append("|".join(_csv_cell(str(column)) for column in columns))
+            tokens += count_tokens(lines[0])
+
+        chunk_lines = [
+            "|".join(_csv_cell(value) for value in row)
+            for row in chunk[columns].itertuples(index=False, name=None)
+        ]
+        chunk_lines = [line for line in chunk_lines if line.replace("|", "").strip()]
+        for line, line_tokens in zip(chunk_lines, count_tokens_batch(chunk_lines)):
+            # +1 for the newline joining the rows
+            if tokens + line_tokens + 1 > max_tokens:
+                truncated = True
+                break
+            lines.append(line)
+            tokens += line_tokens + 1
+            rows += 1
+        if truncated:
+            break
+
+    if truncated:
+        lines.append(f"... truncated after {rows} rows")
+    return "\n".join(lines), rows, truncated
+
+
+def _csv_cell(value: str) -> str:
+    """Flatten newlines inside quoted cells and escape the delimiter so each row stays on one line with its columns aligned"""
+    return " ".join(value.split()).replace("|", "\\|")
+
+
+def _csv_columns(chunk: pd.DataFrame, prune_empty_columns: bool) -> List[str]:
+    """Columns to keep, dropping those that are empty throughout the first chunk"""
+    if not prune_empty_columns:
+        return list(chunk.columns)
+    return [
+        column for column in chunk.columns
+        if chunk[column].str.strip().ne("").any()
+    ]
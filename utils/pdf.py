@@ -0,0 +1,102 @@
+import re
+import struct
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+# Poppler utilities read the PDF from stdin when the file name is "-" and
+# write to stdout when no output file is given, so nothing touches the disk.
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _run_poppler(args: List[str], pdf_bytes: bytes, timeout: int) -> bytes:
+    result = subprocess.run(args, input=pdf_bytes, capture_output=True, timeout=timeout, check=True)
+    return result.stdout
+
+
+def pdf_info(pdf_bytes: bytes, timeout: int = 30) -> Dict[str, Any]:
+    """
+    Read the PDF metadata reported by pdfinfo
+    Returns:
+        Dict[str, Any]: pdfinfo fields, with "Pages" as an int
+    """
+    output = _run_poppler(["pdfinfo", "-"], pdf_bytes, timeout).decode("utf-8", errors="replace")
+    info = {}
+    for line in output.splitlines():
+        key, _, value = line.partition(":")
+        info[key.strip()] = value.strip()
+    if "Pages" not in info:
+        raise ValueError("Unable to read page count from PDF")
+    info["Pages"] = int(info["Pages"])
+    return info
+
+
+def page_size_points(info: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """Parse pdfinfo's "Page size" (e.g. "612 x 792 pts (letter)") into (width, height) in points"""
+    match = re.match(r"([\d.]+) x ([\d.]+) pts", info.get("Page size", ""))
+    if not match:
+        return None
+    return float(match.group(1)), float(match.group(2))
+
+
+def pdf_text_pages(pdf_bytes: bytes, page_count: int, timeout: int = 30) -> List[str]:
+    """
+    Extract the embedded text of every page with pdftotext
+    Returns:
+        List[str]: Text per page, padded with empty strings up to page_count
+    """
+    output = _run_poppler(["pdftotext", "-layout", "-enc", "UTF-8", "-", "-"], pdf_bytes, timeout)
+    # pdftotext terminates every page with a form feed
+    page_texts = output.decode("utf-8", errors="replace").split("\f")
+    return (page_texts + [""] * page_count)[:page_count]
+
+
+def render_pdf_pages(pdf_bytes: bytes, first_page: int, last_page: int, dpi: int = 200, thread_count: int = 1, timeout: int = 120) -> List[bytes]:
+    """
+    Render a page range to PNG buffers with pdftoppm
+    Args:
+        pdf_bytes: PDF content
+        first_page: First 1-based page to render
+        last_page: Last 1-based page to render (inclusive)
+        dpi: Render resolution
+        thread_count: Number of pdftoppm processes the range is split across
+    Returns:
+        List[bytes]: One PNG per page, in page order
+    """
+    page_total = last_page - first_page + 1
+    thread_count = max(1, min(thread_count, page_total))
+    chunk = -(-page_total // thread_count)
+    ranges = [
+        (start, min(start + chunk - 1, last_page))
+        for start in range(first_page, last_page + 1, chunk)
+    ]
+
+    def render(page_range):
+        start, end = page_range
+        args = ["pdftoppm", "-png", "-r", str(dpi), "-f", str(start), "-l", str(end), "-"]
+        return split_png_stream(_run_poppler(args, pdf_bytes, timeout))
+
+    if len(ranges) == 1:
+        return render(ranges[0])
+
+    with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+        return [png for pngs in executor.map(render, ranges) for png in pngs]
+
+
+def split_png_stream(data: bytes) -> List[bytes]:
+    """Split concatenated PNG files by walking their chunks up to each IEND"""
+    images = []
+    offset = 0
+    while offset < len(data):
+        if data[offset:offset + len(PNG_SIGNATURE)] != PNG_SIGNATURE:
+            raise ValueError("Invalid PNG stream from pdftoppm")
+        position = offset + len(PNG_SIGNATURE)
+        while True:
+            length, chunk_type = struct.unpack(">I4s", data[position:position + 8])
+            position += 12 + length
+            if chunk_type == b"IEND":
+                break
+        images.append(data[offset:position])
+        offset = position
+    return images
@@ -60,6 +60,20 @@ check_relevance_prompt = '''
    %%%
 '''
 
+relevance_and_extraction_prompt = '''
+   You are an advanced document classifier and data extraction assistant. Handle the document content (delimited by `%%%`) in two steps.
+
+   STEP 1 - CLASSIFICATION:
+   1. Set `document_type` to one of the following classes:
+      - **relevant_document**: The document contains information related to loans, lending, or financial services.
+      - **irrelevant_document**: The document does not pertain to loans or financial services.
+   2. Look for loan types, interest rates, credit scores, loan amounts, or financial terms, and consider the overall context of the document.
+   3. Set `confidence` of the classification (High/Medium/Low).
+   4. If the document is `irrelevant_document`, stop here and leave `extracted_info`, `message` and `chat_title` empty.
+
+   STEP 2 - EXTRACTION (only for `relevant_document`), fill `extracted_info`, `message` and `chat_title` as follows:
+''' + data_extraction_prompt
+
 response_generation_prompt = '''
    You are a smart loan suggesting assistant. Your task is to suggest suitable loan based on the user message, intent and given knowledge base. Follow instructions, important guidelines carefully.
    IMPORTANT GUIDELINES:
@@ -0,0 +1,37 @@
+import io
+from typing import Tuple
+
+import pytesseract
+from PIL import Image
+
+# Dispatched to the process pool; kept free of service imports so workers load only what Tesseract needs
+
+
+def tesseract_ocr(image_bytes: bytes, lang: str, timeout: int = 0) -> Tuple[str, float]:
+    """
+    Run Tesseract in a worker process
+    Args:
+        timeout: Seconds before pytesseract kills the tesseract process (0 for no limit)
+    Returns:
+        Tuple[str, float]: (text, mean word confidence 0-100)
+    """
+    image = Image.open(io.BytesIO(image_bytes)).convert("L")
+    data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT, timeout=timeout)
+
+    lines = []
+    confidences = []
+    current_line = None
+    for i, word in enumerate(data["text"]):
+        confidence = float(data["conf"][i])
+        if confidence < 0 or not word.strip():
+            continue
+        line = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        if line != current_line:
+            lines.append([])
+            current_line = line
+        lines[-1].append(word)
+        confidences.append(confidence)
+
+    text = "\n".join(" ".join(words) for words in lines)
+    confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return text, confidence
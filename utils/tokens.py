@@ -0,0 +1,64 @@
+from functools import lru_cache
+from typing import List
+
+import tiktoken
+
+# grok's tokenizer is not public; cl100k_base is a close enough estimate for budgeting
+ENCODING_NAME = "cl100k_base"
+
+
+@lru_cache(maxsize=1)
+def get_encoding() -> tiktoken.Encoding:
+    return tiktoken.get_encoding(ENCODING_NAME)
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    return [len(tokens) for tokens in get_encoding().encode_batch(texts, disallowed_special=())]
+
+
+def sample_text(text: str, max_tokens: int, head_ratio: float = 0.6, chunk_tokens: int = 300) -> str:
+    """
+    Token-bounded sample of a document: the opening tokens plus evenly spaced
+    chunks from the rest. Text within the budget is returned unchanged.
+    Args:
+        text: Full document text
+        max_tokens: Token budget for the sample
+        head_ratio: Share of the budget spent on the start of the document
+        chunk_tokens: Size of each sampled chunk after the head
+    Returns:
+        str: The sample, with sampled chunks separated by "..."
+    """
+    encoding = get_encoding()
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+
+    head_tokens = int(max_tokens * head_ratio)
+    parts = [encoding.decode(tokens[:head_tokens])]
+
+    rest = tokens[head_tokens:]
+    chunk_count = max(1, (max_tokens - head_tokens) // chunk_tokens)
+    stride = len(rest) // chunk_count
+    for i in range(chunk_count):
+        start = i * stride + max(0, (stride - chunk_tokens) // 2)
+        parts.append(encoding.decode(rest[start:start + chunk_tokens]))
+
+    return "\n...\n".join(parts)
+
+
+def split_text(text: str, chunk_tokens: int, overlap_tokens: int = 0) -> List[str]:
+    """Split text into chunks of at most chunk_tokens tokens, consecutive chunks sharing overlap_tokens"""
+    encoding = get_encoding()
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= chunk_tokens:
+        return [text]
+
+    step = max(1, chunk_tokens - overlap_tokens)
+    return [
+        encoding.decode(tokens[start:start + chunk_tokens])
+        for start in range(0, len(tokens) - overlap_tokens, step)
+    ]